@@ -3,11 +3,28 @@ from abc import ABC
 
 class AbstractAi(ABC):
 
+    """ Interface of the models deciding on the next experiments.
+
+    get_decision returns the next single decision. propose_batch returns n
+    decisions at once and takes the decisions still being measured as pending,
+    so a model can propose the next spots while earlier ones are measured.
+    Measured results are fed back with observe as (decision, result) pairs."""
+
     @abc.abstractmethod
     def __init__(self):
         ...
-    
+
     @abc.abstractmethod
     def get_decision(self):
         ...
-    
\ No newline at end of file
+
+    def propose_batch(self, n: int, pending: list = None) -> list:
+
+        """ Returns n decisions. Models that can take pending decisions into
+        account override this, by default get_decision is called n times."""
+
+        return [self.get_decision() for _ in range(n)]
+
+    @abc.abstractmethod
+    def observe(self, results: list) -> None:
+        ...
@@ -0,0 +1,133 @@
+import numpy as np
+from math import pi
+
+FARADAY_CONSTANT = 96485.332 #C/mol
+GAS_CONSTANT = 8.314462 #J/(mol K)
+
+class ElectrodeModel:
+
+    """Butler-Volmer surrogate model of an OER electrode in the SECM droplet cell.
+
+    The faradaic current follows the Butler-Volmer equation around the equilibrium
+    potential, a double layer capacitance adds a charging current proportional to the
+    sweep rate and the uncompensated resistance causes an iR drop between the applied
+    and the measured potential.
+    To give the agent something to learn the catalyst activity (log10 of the exchange
+    current density) changes with the applied potential: it activates slowly above the
+    activation potential and degrades above the degradation potential.
+
+    All state is kept in NumPy arrays of shape (n,) so that n virtual electrodes
+    are simulated at once. Measurements are returned in the same order as
+    Potentiostat.get_actual_values(): potential, current, applied potential."""
+
+    def __init__(self,
+                 n: int = 1,
+                 equilibrium_potential: float = 0.2, #V
+                 exchange_current_density: float = 1e-7, #A/cm^2
+                 anodic_transfer_coefficient: float = 0.7,
+                 cathodic_transfer_coefficient: float = 0.3,
+                 double_layer_capacitance: float = 4e-5, #F/cm^2
+                 uncompensated_resistance: float = 100, #Ohm
+                 electrode_diameter: float = 0.05, #cm
+                 temperature: float = 298.15, #K
+                 activity_spread: float = 0.3, #decades
+                 activation_potential: float = 0.45, #V
+                 degradation_potential: float = 0.65, #V
+                 activation_rate: float = 3e-3, #decades/s
+                 degradation_rate: float = 1e-1, #decades/(s V)
+                 max_activation: float = 1.0, #decades
+                 current_noise: float = 1e-9, #A
+                 potential_noise: float = 1e-4 #V
+                 ) -> None:
+
+        self.n = n
+        self.equilibrium_potential = equilibrium_potential
+        self.exchange_current_density = exchange_current_density
+        self.anodic_transfer_coefficient = anodic_transfer_coefficient
+        self.cathodic_transfer_coefficient = cathodic_transfer_coefficient
+        self.double_layer_capacitance = double_layer_capacitance
+        self.uncompensated_resistance = uncompensated_resistance
+        self.area = pi * (0.5 * electrode_diameter)**2 #cm^2
+        self.f = FARADAY_CONSTANT/(GAS_CONSTANT * temperature)
+        self.activity_spread = activity_spread
+        self.activation_potential = activation_potential
+        self.degradation_potential = degradation_potential
+        self.activation_rate = activation_rate
+        self.degradation_rate = degradation_rate
+        self.max_activation = max_activation
+        self.current_noise = current_noise
+        self.potential_noise = potential_noise
+
+        # log10 of the exchange current density of each electrode when it was reset
+        self.initial_activity = np.full(n, np.log10(exchange_current_density))
+        # log10 of the current exchange current density of each electrode
+        self.activity = self.initial_activity.copy()
+        self.applied_potential = np.full(n, equilibrium_potential)
+        self.sweep_rate = np.zeros(n)
+
+    def reset(self,
+              potential: float,
+              mask: np.ndarray = None,
+              rng: np.random.Generator = None) -> None:
+
+        """Resets the electrodes selected by mask (all if None) to a fresh spot
+        held at the given potential. With a random generator the activity of
+        each fresh spot is drawn around the nominal exchange current density."""
+
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        activity = np.log10(self.exchange_current_density)
+        if rng is not None and self.activity_spread > 0:
+            activity = activity + rng.normal(0, self.activity_spread, self.n)
+
+        self.initial_activity = np.where(mask, activity, self.initial_activity)
+        self.activity = np.where(mask, self.initial_activity, self.activity)
+        self.applied_potential = np.where(mask, potential, self.applied_potential)
+        self.sweep_rate = np.where(mask, 0.0, self.sweep_rate)
+
+    def apply(self, potential: np.ndarray, dt: float) -> None:
+
+        """Applies the potential to the electrodes and holds it for dt seconds
+        of virtual time, ageing the catalyst activity accordingly."""
+
+        potential = np.broadcast_to(np.asarray(potential, dtype=float), (self.n,))
+        self.sweep_rate = (potential - self.applied_potential)/dt if dt > 0 else np.zeros(self.n)
+        self.applied_potential = potential.copy()
+
+        activation = np.where((potential > self.activation_potential) & (potential < self.degradation_potential),
+                              self.activation_rate * dt, 0.0)
+        degradation = self.degradation_rate * dt * np.clip(potential - self.degradation_potential, 0, None)
+        self.activity = np.minimum(self.activity + activation - degradation,
+                                   self.initial_activity + self.max_activation)
+
+    def faradaic_current(self, potential: np.ndarray) -> np.ndarray:
+
+        """Butler-Volmer current in A at the given electrode potential."""
+
+        overpotential = potential - self.equilibrium_potential
+        current_density = 10**self.activity * (np.exp(self.anodic_transfer_coefficient * self.f * overpotential)
+                                               - np.exp(-self.cathodic_transfer_coefficient * self.f * overpotential))
+        return current_density * self.area
+
+    def read(self, rng: np.random.Generator = None) -> tuple:
+
+        """Returns potential, current and applied potential of all electrodes
+        as arrays, with measurement noise if a random generator is given."""
+
+        current = (self.faradaic_current(self.applied_potential)
+                   + self.double_layer_capacitance * self.area * self.sweep_rate)
+        potential = self.applied_potential - current * self.uncompensated_resistance
+        if rng is not None:
+            current = current + rng.normal(0, self.current_noise, self.n)
+            potential = potential + rng.normal(0, self.potential_noise, self.n)
+        return potential, current, self.applied_potential.copy()
+
+    def potential_at_current_density(self, current_density: float = 0.01) -> np.ndarray:
+
+        """Applied potential at which each electrode reaches the given current density
+        in A/cm^2, from the anodic Tafel branch plus the iR drop.
+        This is what measure_overpotential extracts from a real linear sweep."""
+
+        tafel_overpotential = (np.log(current_density) - self.activity * np.log(10))/(self.anodic_transfer_coefficient * self.f)
+        return (self.equilibrium_potential + tafel_overpotential
+                + current_density * self.area * self.uncompensated_resistance)
@@ -0,0 +1,122 @@
+import numpy as np
+from Ai.AbstractAi import AbstractAi
+
+class GaussianProcessAi(AbstractAi):
+
+    """ Reference Bayesian optimisation model over continuous experiment settings.
+
+    A Gaussian process with an RBF kernel on the settings scaled to the unit cube
+    predicts the result (e.g. the overpotential) of untested settings. The next
+    settings minimise the lower confidence bound mean - exploration * std over
+    n_candidates random candidates (maximise the upper bound with minimize=False).
+    Batches are filled with the kriging believer heuristic: every chosen and every
+    pending setting is treated as observed with its predicted mean, so the settings
+    of one batch and those still being measured are spread out instead of repeated.
+    Until initial_points results are observed the settings are drawn at random.
+
+    bounds holds the (minimum, maximum) of every setting, decisions are
+    NumPy arrays of the settings in the same order."""
+
+    def __init__(self,
+                 bounds: list,
+                 length_scale: float = 0.2,
+                 noise: float = 1e-4,
+                 exploration: float = 2.0,
+                 n_candidates: int = 2000,
+                 initial_points: int = 3,
+                 minimize: bool = True,
+                 seed: int = None) -> None:
+
+        self.bounds = np.asarray(bounds, dtype = float).reshape(-1, 2)
+        self.length_scale = length_scale
+        self.noise = noise # Noise variance relative to the variance of the results
+        self.exploration = exploration
+        self.n_candidates = n_candidates
+        self.initial_points = initial_points
+        self.minimize = minimize
+        self.rng = np.random.default_rng(seed)
+        self.x = np.empty((0, len(self.bounds))) # Observed settings on the unit cube
+        self.y = np.empty(0) # Observed results
+
+    def get_decision(self) -> np.ndarray:
+        return self.propose_batch(1)[0]
+
+    def propose_batch(self, n: int, pending: list = None) -> list:
+
+        """ Returns n settings, taking the settings in pending as being measured."""
+
+        if len(self.y) < self.initial_points:
+            return list(self._to_bounds(self.rng.random((n, len(self.bounds)))))
+
+        x, y = self.x, self._normalized_results()
+        if pending:
+            pending = self._to_unit(np.asarray(pending, dtype = float))
+            x, y = np.vstack([x, pending]), np.concatenate([y, self._predict(x, y, pending)[0]])
+
+        decisions = []
+        for _ in range(n):
+            candidates = self.rng.random((self.n_candidates, len(self.bounds)))
+            mean, std = self._predict(x, y, candidates)
+            best = candidates[np.argmin(mean - self.exploration * std)]
+            decisions.append(self._to_bounds(best))
+            # Kriging believer: take the predicted mean as the result of the chosen settings
+            believed = self._predict(x, y, best[None, :])[0]
+            x, y = np.vstack([x, best]), np.concatenate([y, believed])
+        return decisions
+
+    def observe(self, results: list) -> None:
+
+        """ Adds measured (settings, result) pairs."""
+
+        for settings, result in results:
+            self.x = np.vstack([self.x, self._to_unit(np.asarray(settings, dtype = float))])
+            self.y = np.append(self.y, float(result))
+
+    def predict(self, settings) -> tuple:
+
+        """ Predicted mean and standard deviation of the results of the settings."""
+
+        settings = self._to_unit(np.atleast_2d(np.asarray(settings, dtype = float)))
+        if len(self.y) == 0:
+            return np.zeros(len(settings)), np.ones(len(settings))
+        mean, std = self._predict(self.x, self._normalized_results(), settings)
+        scale, offset = self._result_scale()
+        sign = 1 if self.minimize else -1
+        return sign * mean * scale + offset, std * scale
+
+    def best(self) -> tuple:
+
+        """ Best observed settings and result."""
+
+        index = np.argmin(self.y) if self.minimize else np.argmax(self.y)
+        return self._to_bounds(self.x[index]), self.y[index]
+
+    def _predict(self, x: np.ndarray, y: np.ndarray, candidates: np.ndarray) -> tuple:
+        kernel = self._kernel(x, x) + self.noise * np.eye(len(x))
+        cholesky = np.linalg.cholesky(kernel)
+        alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, y))
+        cross = self._kernel(candidates, x)
+        mean = cross @ alpha
+        v = np.linalg.solve(cholesky, cross.T)
+        variance = np.clip(1.0 - np.sum(v**2, axis = 0), 1e-12, None)
+        return mean, np.sqrt(variance)
+
+    def _kernel(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        squared_distance = np.sum((a[:, None, :] - b[None, :, :])**2, axis = -1)
+        return np.exp(-0.5 * squared_distance/self.length_scale**2)
+
+    def _result_scale(self) -> tuple:
+        std = np.std(self.y)
+        return (std if std > 0 else 1.0), np.mean(self.y)
+
+    def _normalized_results(self) -> np.ndarray:
+        # Zero mean and unit variance, sign flipped when maximising so the model always minimises
+        scale, offset = self._result_scale()
+        sign = 1 if self.minimize else -1
+        return sign * (self.y - offset)/scale
+
+    def _to_unit(self, settings: np.ndarray) -> np.ndarray:
+        return (settings - self.bounds[:, 0])/(self.bounds[:, 1] - self.bounds[:, 0])
+
+    def _to_bounds(self, unit: np.ndarray) -> np.ndarray:
+        return self.bounds[:, 0] + unit * (self.bounds[:, 1] - self.bounds[:, 0])
@@ -1,29 +1,53 @@
 import numpy as np
-import time
 import os
-import pandas as pd
 
-
-#from .utils import current_density
 from gymnasium.core import Env
 from gymnasium import spaces
-from autolab import Potentiostat
-from secm import SECM
-from math import pi
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+from Instruments.AbstractInstruments import AbstractPotentiostat, AbstractSecm
+from Ai.ElectrodeModel import ElectrodeModel
+from utils.timing import DeadlineScheduler, wait_until
+from utils.instrumentation import tracer, span, timed
+from utils.analysis import overpotential_from_procedure
+from Experiments.ProcedureCache import ProcedureCache
+from Experiments.Equilibration import Equilibration
 
 class OerEnvironment (Env):
 
     """An Open Ai Gym environment for the Sensolytics SECM
-      and a Metrohm Autolab Potentiostat"""
+      and a Metrohm Autolab Potentiostat
+
+      With a spot_map (Instruments.SpotMap) every episode runs on the next
+      planned free spot of the substrate, otherwise the SECM moves on by
+      distance_between_spots.
+      If tracing is enabled (utils.instrumentation) the spans of every episode are
+      attributed to the episode number as spot, and the timing breakdown is
+      exported to timing_path when the environment is closed."""
 
-    def __init__(self, potentiostat: Potentiostat, secm: SECM) -> None:
+    def __init__(self,
+                 potentiostat: AbstractPotentiostat,
+                 secm: AbstractSecm,
+                 spot_map = None,
+                 timing_path: os.PathLike = None) -> None:
         
         #TODO: how to check if potentiostat is connected
         self.potentiostat = potentiostat
         self.secm = secm
+        self.spot_map = spot_map
+        if spot_map is not None: # fail before the first episode if the SECM can not reach all spots
+            spot_map.check_secm(secm)
+        # Spot of the spot map used by the current episode
+        self.spot = None
+        # Number of the current episode, counted from 0
+        self.episode = -1
+        self.timing_path = timing_path
         
         #Distance between experiment spots on the substrate surface
         self.distance_between_spots = 2500
+        # Probe position in um counted from the moves by distance_between_spots, for SECMs
+        # that do not report their position. Starts at the origin, where SECM.new_substrate leaves the probe
+        self.probe_position = [0.0, 0.0]
         
         #Maximum number of steps in an epsiode
         self.max_episode_length = 1500
@@ -36,6 +60,10 @@ class OerEnvironment (Env):
         self.potential_step = 0.00244 #V
         # Time to wait between each step
         self.wait_time = self.potential_step/self.scan_rate
+        # Paces the steps against absolute deadlines so I/O and inference time do not add up
+        self.scheduler = DeadlineScheduler(self.wait_time)
+        # Potential at 0.01 A/cm^2 the agent has to beat to get a positive reward
+        self.target_overpotential = 0.6 #V
         
         self.episode_length = 0
         self.state = self.start_potential
@@ -44,6 +72,14 @@ class OerEnvironment (Env):
         self.spec = None
 
         self.overpotential_procedure = "Overpotential.nox"
+        # Duration of the last overpotential measurement, used to adapt the polling
+        self.overpotential_duration = None
+        # Seconds after which a hanging overpotential measurement is aborted
+        self.overpotential_timeout = 1800
+        # Keeps the overpotential procedure loaded between episodes
+        self.procedure_cache = ProcedureCache(potentiostat)
+        # Waits for the cell to settle at the start potential at the beginning of an episode
+        self.equilibration = Equilibration()
 
 
     def step(self, action: int) -> tuple:
@@ -59,43 +95,81 @@ class OerEnvironment (Env):
         #Increment episode length
         self.episode_length += 1
         #Set state as potential 
-        self.potentiostat.set_potential(self.state)
-        #Wait for until next step can be executed
-        time.sleep(self.wait_time)
+        with span("set_potential"):
+            self.potentiostat.set_potential(self.state)
+        #Wait for the deadline of this step, the time the agent took to decide
+        #since the last step is already part of the settling time
+        with span("step_wait"):
+            jitter = self.scheduler.wait_next()
+        #Get the state of the experiment from the potentiostat
+        with span("get_actual_values"):
+            observation = np.asarray(self.potentiostat.get_actual_values())
+        info = {"jitter": jitter}
 
         if self.episode_length >= self.max_episode_length:
+            info["timing"] = self.scheduler.statistics()
             if self.potentiostat.instrument.Ei.Cell:
-                self.potentiostat.cell_off
-            overpotential = self.measure_overpotential(self.overpotential_procedure)
-            reward = self.reward_function(target, overpotential)
-            done = True
+                self.potentiostat.cell_off()
+            with span("overpotential_measurement"):
+                overpotential = self.measure_overpotential(self.overpotential_procedure)
+            reward = self.reward_function(self.target_overpotential, overpotential)
+            info["overpotential"] = overpotential
+            terminated = True
         else: 
-            done = False
+            terminated = False
             reward = 0
-        
-        #Get the state of the experiment from the potentiostat
-        observation = np.asarray(self.potentiostat.get_actual_values())
-        
-        # Placeholder for info
-        info = {}
 
-        return observation, reward, done, info
+        return observation, reward, terminated, False, info
 
-    def reset(self) -> None:
-        self.secm.prepare_next_experiment(self.distance_between_spots)
+    @timed("reset")
+    def reset(self, seed: int = None, options: dict = None) -> tuple:
+        super().reset(seed = seed)
+        self.episode += 1
+        tracer.begin_spot(self.episode)
+        if self.spot_map is not None:
+            self.spot = self.spot_map.next_spot()
+            if self.spot is None:
+                raise RuntimeError("No free spots left on the substrate")
+        with span("stage_move"):
+            if self.spot is not None:
+                self.spot_map.move_to(self.secm, self.spot)
+                # Used from now on, also if the episode is aborted
+                self.spot_map.mark_used(self.spot)
+            else:
+                self.secm.prepare_next_experiment(self.distance_between_spots)
+                self.probe_position[0] += self.distance_between_spots
         self.state = self.start_potential
 
         if self.potentiostat.instrument.Ei.Cell == False:
-            self.potentiostat.cell_on()
+            with span("cell_on"):
+                self.potentiostat.cell_on()
         self.potentiostat.set_potential(self.state)
+        with span("equilibration"):
+            settle_time = self.equilibration.run(self.potentiostat)
         self.episode_length = 0
+        #The deadlines of the episode count from the moment the start potential is applied
+        self.scheduler.start()
+        observation = np.asarray(self.potentiostat.get_actual_values())
+        info = {"settle_time": settle_time, "settled": self.equilibration.settled}
+        if self.spot is not None:
+            info["coordinates"] = self.spot_map.coordinates(self.spot)
+        elif hasattr(self.secm, "position"):
+            info["coordinates"] = list(self.secm.position)
+        else: # The SECM does not report its position
+            info["coordinates"] = list(self.probe_position)
+        return observation, info
     
     def close(self):
         """Closes the environment and resets the SECM position to wash."""
-        self.secm.move_to_wash()
+        if self.spot_map is not None: # the spot map plans the next tour from the wash
+            self.spot_map.move_to_wash(self.secm)
+        else:
+            self.secm.move_to_wash()
         #TODO: shut off and disconnect potentiostat
         if self.potentiostat.instrument.Ei.Cell:
             self.potentiostat.cell_off()
+        if tracer.enabled and self.timing_path is not None:
+            tracer.export(self.timing_path)
 
     def reward_function(self, target_overpotential: float,
                         observed_overpotential: float) -> float:
@@ -109,45 +183,43 @@ class OerEnvironment (Env):
         
         """Uses a predefined nova procedure to measure a linear sweep.
         Interpolates the overpotential at 0.01 A/cm^-2 by linear interpolation.
-        This method has to many responsibilities should probably be split up."""
-
-        def overpotential(polyfit: np.array) -> float:
-            return (0.01-polyfit[1])/polyfit[0]
+        Raises RuntimeError if the sweep has too few points around 0.01 A/cm^2 for the fit,
+        so a failed measurement does not end up as NaN reward."""
 
-        #Load the procedure to measure Overpotential
-        procedure = self.potentiostat.instrument.LoadProcedure(procedure_path)
+        #Load the procedure to measure Overpotential, only done in the first episode
+        with span("procedure_load"):
+            procedure = self.procedure_cache.get(procedure_path)
         #Measure the procedure
         procedure.Measure()
-        while procedure.IsMeasuring:
-            time.sleep(0.1)
-        df = pd.DataFrame()    
-        
-        #Grab the data from the measured procedure
-        command = procedure.Commands["Overpotential CV"]
-        for column in command.Signals.Names:
-            if len(list(command.Signals.get_Item(column).Value)) != 0:
-                df[column] = list(command.Signals.get_Item(column).Value)
-        # Calculate the current density from the data
-        df["current density"] = df["WE(1).Current"].map(current_density)
-        
-        #linear interpolation of the values around the overpotential at 0.01 A/cm-2
-        line_fit_table = df.loc[(df["current density"]> 0.008) & (df["current density"] < 0.015) & (df["Index"] < 250)]
-        line_fit = np.polyfit(line_fit_table["Potential applied"], line_fit_table["current density"], 1)
-        return overpotential(line_fit)
+        try:
+            self.overpotential_duration = wait_until(lambda: not procedure.IsMeasuring,
+                                                     timeout = self.overpotential_timeout,
+                                                     expected_duration = self.overpotential_duration)
+        except TimeoutError:
+            if hasattr(procedure, "Abort"):
+                procedure.Abort()
+            raise
+        
+        #Fit the forward sweep of the measured data around 0.01 A/cm-2
+        overpotential = overpotential_from_procedure(procedure, "Overpotential CV", max_index = 250)
+        if not np.isfinite(overpotential):
+            raise RuntimeError("The overpotential could not be fitted, the forward sweep "
+                               "has less than two points between 0.008 and 0.015 A/cm^2")
+        return overpotential
     
 class OerEnvironmentSim (Env):
 
-    def __init__(self) -> None:
-        
-        #TODO: how to check if potentiostat is connected
-        # self.potentiostat = potentiostat
-        # self.secm = secm
+    """Simulated version of the OerEnvironment for training agents without hardware.
+    The electrode is replaced by the ElectrodeModel surrogate and time only advances
+    virtually, so a step does not wait for the potential to settle."""
+
+    def __init__(self, model: ElectrodeModel = None) -> None:
         
         #Distance between experiment spots on the substrate surface
         self.distance_between_spots = 2500
         
         #Maximum number of steps in an epsiode
-        self.max_episode_length = 10
+        self.max_episode_length = 1500
         
         # Starting potential to be applied at the beginning of an epsiode
         self.start_potential = 0.2 #V
@@ -155,17 +227,22 @@ class OerEnvironmentSim (Env):
         self.scan_rate = 0.005 #V/s
         # Change of potential for each step
         self.potential_step = 0.00244 #V
-        # Time to wait between each step
+        # Virtual time between each step
         self.wait_time = self.potential_step/self.scan_rate
+        # Potential at 0.01 A/cm^2 the agent has to beat to get a positive reward
+        self.target_overpotential = 0.6 #V
         
         self.episode_length = 0
         #TODO: should probably rename this attribute
         self.state = self.start_potential
         self.action_space = spaces.Discrete(n = 3)
-        self.observation_space = spaces.Box(low = np.array([-1000, -1000, -1000]), high = np.array([1000, 1000, 1000]))
+        # Same layout as the OerEnvironment: potential, current, applied potential
+        self.observation_space = spaces.Box(low = np.array([-0.1, -0.03, -0.1], dtype = np.float32),
+                                            high = np.array([0.7, np.inf, 0.7], dtype = np.float32),
+                                            dtype = np.float32)
         self.spec = None
 
-        self.overpotential_procedure = "Overpotential.nox"
+        self.model = model if model is not None else ElectrodeModel()
 
 
     def step(self, action: int) -> tuple:
@@ -178,46 +255,47 @@ class OerEnvironmentSim (Env):
         # Otherwise stay on current potential
         else:
             pass
+        # Keep the applied potential inside the observation space
+        self.state = min(max(self.state, -0.1), 0.7)
         #Increment episode length
         self.episode_length += 1
-        #Set state as potential 
-        #self.potentiostat.set_potential(self.state)
-        #Wait for until next step can be executed
-        time.sleep(self.wait_time)
+        #Set state as potential and advance the virtual time
+        self.model.apply(self.state, self.wait_time)
 
         if self.episode_length >= self.max_episode_length:
-            print("measuring overpotential")
-            reward = 1
+            overpotential = self.model.potential_at_current_density(0.01)[0]
+            reward = self.reward_function(self.target_overpotential, overpotential)
             terminated = True
         else: 
             terminated = False
             reward = 0
         
-        #Get the state of the experiment from the potentiostat
+        #Get the state of the experiment from the electrode model
         observation = self._get_obs()
         
-        # Placeholder for info
-        info = {}
+        info = {"overpotential": overpotential} if terminated else {}
 
         return observation, reward, terminated, False, info
 
-    def reset(self, seed: None = None) -> tuple:
-    #TODO: Implement this correctly according to open ai gym specifications
-        print("reseting the environment")
+    def reset(self, seed: int = None, options: dict = None) -> tuple:
+        super().reset(seed = seed)
         self.state = self.start_potential
         self.episode_length = 0
-        #self.potentiostat.set_potential(self.state)
+        self.model.reset(self.state, rng = self.np_random)
         info = {}
-        return self._get_obs()
+        return self._get_obs(), info
     
     def close(self):
-        print("closing environment, moving to wash position")
-        #TODO: shut off and disconnect potentiostat
+        """Nothing to close for the simulated environment."""
+        ...
+
+    def reward_function(self, target_overpotential: float,
+                        observed_overpotential: float) -> float:
+        
+        """Calculates the reward for an observed overpotential and a given target overpotential.
+        Reward is normalized to the target overpotential."""
 
-    # def reward_function(self, target_overpotential: float, observed_overpotential: float) -> float:
-    #     """Calculates the reward for an observed overpotential and a given target overpotential.
-    #     Reward is normalized to the target overpotential."""
-    #     return (target_overpotential-observed_overpotential)/target_overpotential
+        return (target_overpotential-observed_overpotential)/target_overpotential
 
     # def measure_overpotential(self, procedure_path) -> float:
         
@@ -246,5 +324,85 @@ class OerEnvironmentSim (Env):
     #     line_fit = np.polyfit(line_fit_table["Potential applied"], line_fit_table["current density"], 1)
     #     return overpotential(line_fit)
     
-    def _get_obs(self) -> tuple:
-        return np.asarray([0, 0, 0]).astype(np.float32)
\ No newline at end of file
+    def _get_obs(self) -> np.ndarray:
+        # Noise and iR drop can push the readings past the bounds of the applied potential
+        observation = np.asarray(self.model.read(self.np_random)).reshape(3).astype(np.float32)
+        return np.clip(observation, self.observation_space.low, self.observation_space.high)
+
+class OerVectorEnvSim (VectorEnv):
+
+    """Batched OerEnvironmentSim stepping num_envs virtual electrodes at once.
+    Actions, observations, rewards and flags are NumPy arrays with num_envs rows.
+    Electrodes that finish their episode are reset in the same step,
+    their last observation is returned in info["final_obs"]."""
+
+    metadata = {"autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, num_envs: int, model: ElectrodeModel = None) -> None:
+
+        self.num_envs = num_envs
+
+        #Maximum number of steps in an epsiode
+        self.max_episode_length = 1500
+        # Starting potential to be applied at the beginning of an epsiode
+        self.start_potential = 0.2 #V
+        # Rate at which the potential can be changed by the agent
+        self.scan_rate = 0.005 #V/s
+        # Change of potential for each step
+        self.potential_step = 0.00244 #V
+        # Virtual time between each step
+        self.wait_time = self.potential_step/self.scan_rate
+        # Potential at 0.01 A/cm^2 the agent has to beat to get a positive reward
+        self.target_overpotential = 0.6 #V
+
+        self.episode_length = np.zeros(num_envs, dtype = np.int64)
+        self.state = np.full(num_envs, self.start_potential)
+        self.single_action_space = spaces.Discrete(n = 3)
+        self.single_observation_space = spaces.Box(low = np.array([-0.1, -0.03, -0.1], dtype = np.float32),
+                                                   high = np.array([0.7, np.inf, 0.7], dtype = np.float32),
+                                                   dtype = np.float32)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        self.model = model if model is not None else ElectrodeModel(n = num_envs)
+
+    def step(self, actions: np.ndarray) -> tuple:
+        actions = np.asarray(actions)
+        # Action = 2 increases, action = 1 decreases the applied potential by potential step
+        self.state = self.state + self.potential_step * ((actions == 2).astype(float) - (actions == 1))
+        self.state = np.clip(self.state, -0.1, 0.7)
+        self.episode_length += 1
+        self.model.apply(self.state, self.wait_time)
+
+        terminated = self.episode_length >= self.max_episode_length
+        truncated = np.zeros(self.num_envs, dtype = bool)
+        reward = np.zeros(self.num_envs)
+        observation = self._get_obs()
+        info = {}
+
+        if terminated.any():
+            overpotential = self.model.potential_at_current_density(0.01)
+            reward = np.where(terminated,
+                              (self.target_overpotential - overpotential)/self.target_overpotential,
+                              0.0)
+            info["final_obs"] = observation.copy()
+            info["_final_obs"] = terminated
+            self._reset_electrodes(terminated)
+            observation[terminated] = self._get_obs()[terminated]
+
+        return observation, reward, terminated, truncated, info
+
+    def reset(self, seed: int = None, options: dict = None) -> tuple:
+        super().reset(seed = seed)
+        self._reset_electrodes(np.ones(self.num_envs, dtype = bool))
+        return self._get_obs(), {}
+
+    def _reset_electrodes(self, mask: np.ndarray) -> None:
+        self.state = np.where(mask, self.start_potential, self.state)
+        self.episode_length[mask] = 0
+        self.model.reset(self.start_potential, mask = mask, rng = self.np_random)
+
+    def _get_obs(self) -> np.ndarray:
+        # Noise and iR drop can push the readings past the bounds of the applied potential
+        observation = np.stack(self.model.read(self.np_random), axis = 1).astype(np.float32)
+        return np.clip(observation, self.single_observation_space.low, self.single_observation_space.high)
@@ -0,0 +1,178 @@
+import os
+import json
+import datetime
+import numpy as np
+from gymnasium import Wrapper
+
+# Per step columns written by the TrajectoryRecorder besides the observations
+STEP_COLUMNS = {"action": np.int64,
+                "reward": np.float32,
+                "terminated": np.bool_,
+                "truncated": np.bool_}
+EPISODE_PATTERN = "episode_{:05d}"
+
+class TrajectoryRecorder(Wrapper):
+
+    """ Records the episodes of an environment for offline reinforcement learning.
+
+    Every episode is stored in its own folder below root_path with one raw binary
+    file per column (observation, action, reward, terminated, truncated) and a
+    metadata.json holding dtype and shape of every column, the coordinates and the
+    final overpotential from info, and the episode start and end time.
+    Rows are collected in chunks of chunk_size and appended to the column files,
+    so an aborted episode keeps everything up to the last chunk. The observation
+    file also holds the observation returned by reset, it has one row more
+    than the other columns. Read the episodes with the TrajectoryStore."""
+
+    def __init__(self, env, root_path: os.PathLike, chunk_size: int = 256) -> None:
+        super().__init__(env)
+        self.root_path = root_path
+        self.chunk_size = chunk_size
+        os.makedirs(root_path, exist_ok = True)
+        self.episode_path = None
+        self.metadata = None
+        self._chunks = None
+
+    def reset(self, **kwargs) -> tuple:
+        if self.episode_path is not None:
+            self.close_episode()
+        observation, info = self.env.reset(**kwargs)
+
+        self.episode_path = os.path.join(self.root_path, EPISODE_PATTERN.format(self._next_episode_number()))
+        os.makedirs(self.episode_path)
+        observation = np.asarray(observation)
+        self.metadata = {"length": 0,
+                         "columns": {"observation": {"dtype": observation.dtype.str,
+                                                     "shape": list(observation.shape)}},
+                         "coordinates": info.get("coordinates"),
+                         "overpotential": None,
+                         "start_time": datetime.datetime.now().isoformat(),
+                         "end_time": None}
+        for column, dtype in STEP_COLUMNS.items():
+            self.metadata["columns"][column] = {"dtype": np.dtype(dtype).str, "shape": []}
+        self._chunks = {column: [] for column in self.metadata["columns"]}
+        self._chunks["observation"].append(observation)
+        return observation, info
+
+    def step(self, action) -> tuple:
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        for column, value in (("observation", observation),
+                              ("action", action),
+                              ("reward", reward),
+                              ("terminated", terminated),
+                              ("truncated", truncated)):
+            self._chunks[column].append(value)
+        self.metadata["length"] += 1
+        if len(self._chunks["action"]) >= self.chunk_size:
+            self._flush()
+
+        if "overpotential" in info:
+            self.metadata["overpotential"] = float(info["overpotential"])
+        if terminated or truncated:
+            self.close_episode()
+        return observation, reward, terminated, truncated, info
+
+    def close(self) -> None:
+        if self.episode_path is not None:
+            self.close_episode()
+        super().close()
+
+    def close_episode(self) -> None:
+
+        """ Writes the remaining rows and the metadata of the current episode."""
+
+        self._flush()
+        self.metadata["end_time"] = datetime.datetime.now().isoformat()
+        with open(os.path.join(self.episode_path, "metadata.json"), "w") as metadata_file:
+            json.dump(self.metadata, metadata_file, indent = 4)
+        self.episode_path = None
+
+    def _flush(self) -> None:
+        for column, rows in self._chunks.items():
+            if not rows:
+                continue
+            dtype = self.metadata["columns"][column]["dtype"]
+            with open(os.path.join(self.episode_path, column + ".raw"), "ab") as column_file:
+                np.asarray(rows, dtype = dtype).tofile(column_file)
+            rows.clear()
+        # Keep the metadata on disk up to date, so a crashed episode stays readable
+        with open(os.path.join(self.episode_path, "metadata.json"), "w") as metadata_file:
+            json.dump(self.metadata, metadata_file, indent = 4)
+
+    def _next_episode_number(self) -> int:
+        numbers = [int(name.split("_")[1]) for name in os.listdir(self.root_path)
+                   if name.startswith("episode_") and name.split("_")[1].isdigit()]
+        return max(numbers, default = -1) + 1
+
+class TrajectoryStore:
+
+    """ Read access to the episodes recorded by the TrajectoryRecorder.
+
+    Columns are memory mapped, so only the rows that are used are read from disk.
+    transitions yields the (observation, action, reward, next observation, terminated,
+    truncated) arrays of every episode as views of the memory maps, sample draws a
+    random batch of transitions over all episodes for a replay buffer."""
+
+    def __init__(self, root_path: os.PathLike) -> None:
+        self.root_path = root_path
+        self.episode_paths = sorted(os.path.join(root_path, name) for name in os.listdir(root_path)
+                                    if name.startswith("episode_")
+                                    and os.path.isfile(os.path.join(root_path, name, "metadata.json")))
+        self.metadata = []
+        for episode_path in self.episode_paths:
+            with open(os.path.join(episode_path, "metadata.json")) as metadata_file:
+                self.metadata.append(json.load(metadata_file))
+        self.lengths = np.array([metadata["length"] for metadata in self.metadata], dtype = np.int64)
+
+    def __len__(self) -> int:
+        return len(self.episode_paths)
+
+    def load_episode(self, episode: int) -> dict:
+
+        """ Memory maps the columns of an episode, returns a dict of column name and array."""
+
+        metadata = self.metadata[episode]
+        columns = {}
+        for column, description in metadata["columns"].items():
+            # Observations include the one returned by reset
+            length = metadata["length"] + 1 if column == "observation" else metadata["length"]
+            file_path = os.path.join(self.episode_paths[episode], column + ".raw")
+            if length == 0 or not os.path.isfile(file_path):
+                columns[column] = np.empty([0] + description["shape"], dtype = description["dtype"])
+                continue
+            columns[column] = np.memmap(file_path,
+                                        dtype = description["dtype"],
+                                        mode = "r",
+                                        shape = tuple([length] + description["shape"]))
+        return columns
+
+    def transitions(self):
+
+        """ Yields the transitions of every episode as a dict of arrays
+        with the keys observation, action, reward, next_observation, terminated and truncated."""
+
+        for episode in range(len(self)):
+            columns = self.load_episode(episode)
+            observations = columns.pop("observation")
+            yield {"observation": observations[:-1],
+                   "next_observation": observations[1:],
+                   **columns}
+
+    def sample(self, batch_size: int, rng: np.random.Generator = None) -> dict:
+
+        """ Draws batch_size random transitions of all episodes."""
+
+        rng = rng if rng is not None else np.random.default_rng()
+        offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        indices = np.sort(rng.integers(0, offsets[-1], size = batch_size))
+        episodes = np.searchsorted(offsets, indices, side = "right") - 1
+        batch = {}
+        for episode in np.unique(episodes):
+            rows = indices[episodes == episode] - offsets[episode]
+            columns = self.load_episode(episode)
+            observations = columns.pop("observation")
+            rows_of_episode = {"observation": observations[rows], "next_observation": observations[rows + 1]}
+            rows_of_episode.update({column: values[rows] for column, values in columns.items()})
+            for column, values in rows_of_episode.items():
+                batch.setdefault(column, []).append(values)
+        return {column: np.concatenate(values) for column, values in batch.items()}
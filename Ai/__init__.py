@@ -1,3 +1,7 @@
 from .AbstractAi import AbstractAi
+from .GaussianProcessAi import GaussianProcessAi
+from .ElectrodeModel import ElectrodeModel
 from .OerEnvironment import OerEnvironment
-from .OerEnvironment import OerEnvironmentSim
\ No newline at end of file
+from .OerEnvironment import OerEnvironmentSim
+from .OerEnvironment import OerVectorEnvSim
+from .TrajectoryRecorder import TrajectoryRecorder, TrajectoryStore
\ No newline at end of file
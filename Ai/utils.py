@@ -1,6 +1,3 @@
-import pandas as pd
-import os
-import matplotlib.pyplot as plt
 from math import pi
 
 gdrive_path = "G:\\Andere Computer\\My Computer\\HPS Data"
@@ -14,4 +14,11 @@ class AbstractExperiment(ABC):
     
     @abc.abstractmethod
     def save_data(self):
-        ...
\ No newline at end of file
+        ...
+
+    @classmethod
+    def from_settings(cls, potentiostat, settings: dict):
+
+        """ Creates the experiment from the experiment_settings of an experiment json file."""
+
+        return cls(potentiostat, settings)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import pandas as pd
+
+class AcquisitionBuffer:
+
+    """Preallocated, chunked storage for the rows acquired during an experiment.
+
+    Rows are written into a NumPy array allocated up front. Every chunk_size rows
+    the completed chunk is appended to the spool file (if one is given) and handed
+    back to the caller, so data is on disk and visible while the experiment runs.
+    With keep_in_memory set to False only a single chunk is held in memory and the
+    full table is read back from the spool file, which bounds memory for long runs.
+    Chunks are views into the buffer, in that mode they are reused for the next chunk.
+    The first and the last row appended are kept in first_row and last_row."""
+
+    def __init__(self,
+                 columns: list,
+                 n_rows: int,
+                 chunk_size: int = 256,
+                 spool_path: os.PathLike = None,
+                 keep_in_memory: bool = True) -> None:
+
+        if not keep_in_memory and spool_path is None:
+            raise ValueError("A spool path is needed if the data is not kept in memory")
+
+        self.columns = list(columns)
+        self.n_rows = n_rows
+        self.chunk_size = chunk_size
+        self.spool_path = spool_path
+        self.keep_in_memory = keep_in_memory
+
+        rows_to_allocate = max(n_rows, 1) if keep_in_memory else chunk_size
+        self._data = np.empty((rows_to_allocate, len(self.columns)))
+        self._length = 0 # Number of rows appended
+        self._flushed = 0 # Number of rows written to the spool file
+        self.first_row = None
+        self.last_row = None
+
+        if self.spool_path is not None:
+            with open(self.spool_path, "w") as spool_file:
+                spool_file.write(",".join(self.columns) + "\n")
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, row: tuple) -> np.ndarray:
+
+        """Appends a row. Returns the chunk if the row completed one, otherwise None."""
+
+        if self._length >= self.n_rows:
+            raise IndexError("Acquisition buffer is full")
+        self._data[self._position(self._length)] = row
+        self.last_row = tuple(row)
+        if self._length == 0:
+            self.first_row = self.last_row
+        self._length += 1
+
+        if self._length - self._flushed == self.chunk_size:
+            return self.flush()
+        return None
+
+    def flush(self) -> np.ndarray:
+
+        """Writes the rows appended since the last flush to the spool file
+        and returns them. Returns None if there is nothing to flush."""
+
+        if self._length == self._flushed:
+            return None
+        chunk = self._data[self._position(self._flushed):self._position(self._length)]
+
+        if self.spool_path is not None:
+            with open(self.spool_path, "a") as spool_file:
+                np.savetxt(spool_file, chunk, delimiter = ",")
+        self._flushed = self._length
+        return chunk
+
+    def to_array(self) -> np.ndarray:
+
+        """Returns all rows acquired so far."""
+
+        if self.keep_in_memory:
+            return self._data[:self._length]
+        self.flush()
+        return pd.read_csv(self.spool_path).to_numpy()
+
+    def to_dataframe(self) -> pd.DataFrame:
+
+        """Returns all rows acquired so far as a data frame."""
+
+        if self.keep_in_memory:
+            return pd.DataFrame(self._data[:self._length].copy(), columns = self.columns)
+        self.flush()
+        return pd.read_csv(self.spool_path)
+
+    def _position(self, row: int) -> int:
+        # Without keeping everything in memory the rows since the last flush start at the top of the array
+        return row if self.keep_in_memory else row - self._flushed
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Experiments.AbstractExperiment import AbstractExperiment
+from FileManager.DataFile import SECMDataFile
+from FileManager.FileManager import FileManager
+from utils.instrumentation import tracer, span
+
+class Campaign:
+
+    """ Runs an experiment on consecutive spots of a substrate.
+
+    Saving (and the optional analysis) of spot N runs on a worker thread while
+    the SECM moves to spot N+1 and measures it. The data of spot N is handed to the
+    worker as the results_data of the experiment right after its measurement, which
+    is safe as experiments like LineSweep assign a new results_data on every measurement.
+    Experiments that keep their data in place until save_data (e.g. NovaProcedure)
+    only start the next measurement once spot N is saved.
+    Experiments with a spool_path (LineSweep) spool every spot to its own file next to
+    the saved data, the spool file is removed once the spot is saved.
+    After every saved spot the progress is written to a JSON file in the root save path,
+    so an interrupted campaign resumes after the last completed spot.
+    If tracing is enabled (utils.instrumentation) the timing breakdown per spot
+    is exported next to the progress file at the end of the run.
+
+    With a spot_map (Instruments.SpotMap) the spots are visited in its planned order
+    and marked as used or failed, otherwise the SECM moves on by spot_increment.
+    metadata is the experiment_metadata of the experiment json file.
+    analyse is called on the worker thread with the SECMDataFile of each spot,
+    its return value is kept in the progress file, as is the settle time
+    of experiments with an equilibration stage."""
+
+    def __init__(self,
+                 experiment: AbstractExperiment,
+                 secm,
+                 file_manager: FileManager,
+                 metadata: dict,
+                 spot_increment: float = 2500,
+                 file_format: str = "csv",
+                 analyse = None,
+                 spot_map = None) -> None:
+
+        self.experiment = experiment
+        self.secm = secm
+        self.file_manager = file_manager
+        self.metadata = metadata
+        self.batch_id = int(metadata["batch_id"])
+        self.spot_increment = spot_increment
+        self.file_format = file_format
+        self.analyse = analyse
+        self.spot_map = spot_map
+        if spot_map is not None: # fail before the first spot if the SECM can not reach all spots
+            spot_map.check_secm(secm)
+        self.campaign_name = "campaign_{:03d}_{}".format(self.batch_id, experiment.__class__.__name__)
+        self.progress_path = os.path.join(file_manager.root_path, self.campaign_name + ".json")
+        self.timing_path = os.path.join(file_manager.root_path, self.campaign_name + "_timing.csv")
+        self.progress = {"completed_spots": 0, "files": [], "results": [], "settle_times": []}
+        self.throughput = 0.0 # spots per hour
+
+    def run(self, number_of_spots: int, resume: bool = True) -> None:
+
+        """ Measures number_of_spots spots in total, including those completed before if resuming."""
+
+        if resume and os.path.isfile(self.progress_path):
+            with open(self.progress_path) as progress_file:
+                self.progress = json.load(progress_file)
+        first_spot = self.progress["completed_spots"]
+        if self.spot_map is None: # the spot map knows which spots are used already
+            for _ in range(first_spot): # move past the spots completed in an earlier run
+                self.secm.prepare_next_experiment(self.spot_increment)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers = 1) as executor:
+            pending_save = None
+            for spot in range(first_spot, number_of_spots):
+                tracer.begin_spot(spot)
+                map_spot = self.spot_map.next_spot() if self.spot_map is not None else None
+                if self.spot_map is not None and map_spot is None:
+                    print("No free spots left on the substrate")
+                    break
+                with span("stage_move"):
+                    if map_spot is not None:
+                        self.spot_map.move_to(self.secm, map_spot)
+                    elif spot > first_spot:
+                        self.secm.prepare_next_experiment(self.spot_increment)
+                if pending_save is not None and not hasattr(self.experiment, "results_data"):
+                    with span("wait_for_save"):
+                        pending_save.result() # the experiment holds the data of the previous spot until it is saved
+
+                if hasattr(self.experiment, "spool_path"):
+                    self.experiment.spool_path = self.spool_file_path(spot)
+                with span("measure"):
+                    try:
+                        self.experiment.measure()
+                    except BaseException:
+                        if map_spot is not None:
+                            self.spot_map.mark_failed(map_spot)
+                        raise
+                if map_spot is not None:
+                    self.spot_map.mark_used(map_spot)
+                    coordinates = self.spot_map.coordinates(map_spot)
+                else:
+                    coordinates = self.spot_coordinates(spot)
+                if pending_save is not None: # at most one spot is waiting to be saved
+                    with span("wait_for_save"):
+                        pending_save.result()
+                    self.report_throughput(spot - first_spot, start_time)
+                pending_save = executor.submit(self.save_spot,
+                                               spot,
+                                               coordinates,
+                                               getattr(self.experiment, "results_data", None),
+                                               getattr(self.experiment, "settle_time", None))
+
+            if pending_save is not None:
+                pending_save.result()
+                self.report_throughput(self.progress["completed_spots"] - first_spot, start_time)
+
+        if tracer.enabled:
+            tracer.export(self.timing_path)
+
+    def save_spot(self, spot: int, coordinates: list, results_data = None, settle_time: float = None) -> None:
+
+        """ Saves the data of the spot, runs the analysis and records the progress.
+        results_data and settle_time are those of the experiment after measuring the spot,
+        without results_data the experiment saves its data itself."""
+
+        tracer.begin_spot(spot) # runs on the worker thread
+        if results_data is not None:
+            datafile = SECMDataFile("",
+                                    results_data,
+                                    self.metadata["experiment_name"],
+                                    self.metadata["experiment_id"],
+                                    self.metadata["substrate material"],
+                                    self.batch_id,
+                                    self.metadata.get("ai_model"),
+                                    self.metadata.get("ai_model_id"),
+                                    coordinates)
+            with span("save"):
+                file_path = self.file_manager.save_datafile(datafile, self.file_format, experiment = self.experiment)
+            with span("analysis"):
+                result = self.analyse(datafile) if self.analyse is not None else None
+        else: # experiments like NovaProcedure save their own file format
+            _, file_path = self.file_manager.allocate_file_path(self.batch_id, self.experiment)
+            with span("save"):
+                self.experiment.save_data(file_path)
+            self.file_manager.register_file(file_path)
+            result = None
+        spool_path = self.spool_file_path(spot)
+        if os.path.isfile(spool_path): # the data of the spot is saved now
+            os.remove(spool_path)
+
+        self.progress["completed_spots"] = spot + 1
+        self.progress["files"].append(file_path)
+        self.progress["results"].append(result)
+        self.progress.setdefault("settle_times", []).append(settle_time)
+        with open(self.progress_path, "w") as progress_file:
+            json.dump(self.progress, progress_file, indent = 4)
+
+    def spool_file_path(self, spot: int) -> str:
+
+        """ Path of the spool file of the spot, in the folder the data of the experiment is saved to."""
+
+        folder_path = self.file_manager.generate_folder_path(self.experiment)
+        self.file_manager.check_create_folder(folder_path)
+        return os.path.join(folder_path, "{}_spot_{:03d}.spool".format(self.campaign_name, spot))
+
+    def spot_coordinates(self, spot: int) -> list:
+
+        """ Coordinates of the spot, counted from the coordinates in the metadata
+        in steps of the spot increment."""
+
+        x, y = self.metadata.get("coordinates") or (0, 0)
+        return [x + spot * self.spot_increment, y]
+
+    def report_throughput(self, spots_done: int, start_time: float) -> None:
+        self.throughput = spots_done/((time.perf_counter() - start_time)/3600)
+        print(f"{self.progress['completed_spots']} spots completed, {self.throughput:.1f} spots per hour")
@@ -0,0 +1,71 @@
+from collections import deque
+from utils.timing import DeadlineScheduler
+
+class Equilibration:
+
+    """ Waits until the cell is equilibrated at the applied potential.
+
+    The actual values of the potentiostat are polled every poll_interval seconds.
+    The cell counts as equilibrated as soon as potential and current of the last
+    window readings each vary by no more than their tolerance. After timeout seconds
+    the wait ends regardless, settled is then False.
+    The run method returns the settle time, which is also kept in settle_time.
+
+    Settings (the equilibration block of the experiment settings):
+        potential_tolerance: allowed spread of the potential in V
+        current_tolerance: allowed spread of the current in A
+        window: number of consecutive readings that have to be stable
+        poll_interval: seconds between two readings
+        timeout: maximum seconds to wait"""
+
+    def __init__(self,
+                 potential_tolerance: float = 0.001,
+                 current_tolerance: float = 1e-7,
+                 window: int = 5,
+                 poll_interval: float = 0.02,
+                 timeout: float = 5.0) -> None:
+
+        self.potential_tolerance = potential_tolerance
+        self.current_tolerance = current_tolerance
+        self.window = window
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.settle_time = None
+        self.settled = False
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "Equilibration":
+
+        """ Creates the equilibration from the equilibration block of experiment settings,
+        missing keys keep their defaults."""
+
+        return cls(**settings.get("equilibration", {}))
+
+    def run(self, potentiostat) -> float:
+
+        """ Polls the potentiostat until the cell is stable or the timeout
+        has passed and returns the time waited in seconds."""
+
+        potentials = deque(maxlen = self.window)
+        currents = deque(maxlen = self.window)
+        scheduler = DeadlineScheduler(self.poll_interval)
+        scheduler.start()
+        self.settled = False
+
+        while True:
+            potential, current, _ = potentiostat.get_actual_values()
+            potentials.append(potential)
+            currents.append(current)
+            if len(potentials) == self.window and self.is_stable(potentials, currents):
+                self.settled = True
+                break
+            if scheduler.elapsed() + self.poll_interval > self.timeout:
+                break
+            scheduler.wait_next()
+
+        self.settle_time = scheduler.elapsed()
+        return self.settle_time
+
+    def is_stable(self, potentials: deque, currents: deque) -> bool:
+        return (max(potentials) - min(potentials) <= self.potential_tolerance
+                and max(currents) - min(currents) <= self.current_tolerance)
@@ -1,72 +1,195 @@
 from Experiments.AbstractExperiment import AbstractExperiment
-from autolab import Potentiostat
-import time
+from Experiments.AcquisitionBuffer import AcquisitionBuffer
+from Experiments.Equilibration import Equilibration
+from utils.timing import DeadlineScheduler
+from utils.instrumentation import span
+from Instruments.AbstractInstruments import AbstractPotentiostat
+from FileManager.DataFile import DataLoader
 import os
+import math
+import tempfile
 import pandas as pd
 
+# Columns of results_data
+RESULT_COLUMNS = ["time", "potential", "current", "potential_applied"]
+
 class LineSweep(AbstractExperiment):
 
     """ Experiment Class to perform a line sweep experiment
     using a autolab potentiostat.
     
     The measure method performs the experiment.
-    Data is stored in the results_data attribute as a pandas dataframe.
+    The measure_iter method performs the experiment as a generator
+    yielding the data in chunks while it is acquired.
+    Data is stored in the results_data attribute as a pandas dataframe,
+    the achieved scan rate, step timing and settle time in the sweep_statistics attribute.
+    Every chunk is also appended to a spool file, so a crash does not lose the sweep.
+    The spool file is spool_path if it is set (Campaign sets one per spot next to the
+    saved data), otherwise a new file in the temporary directory for every sweep.
+    With keep_in_memory set to False results_data is a DataLoader of the spool file
+    (see FileManager.DataFile), the table is only read when it is used.
+    Before the sweep the cell is equilibrated at the start potential,
+    see Equilibration for the optional equilibration settings.
+
+    With step_mode "adaptive" the step size follows the measured dI/dE: every step
+    aims at a current change of target_current_change, bounded by min_step_potential
+    and max_step_potential. Each potential is applied at the time it is reached at
+    the scan rate, so the average scan rate stays the same as in the uniform mode
+    while flat regions of the sweep are covered with fewer points.
     The save_data method saves the data as a csv file to the provided location """
 
-    def __init__ (self, potentiostat: Potentiostat, settings: dict) -> None:
+    def __init__ (self, potentiostat: AbstractPotentiostat, settings: dict) -> None:
         
         self.potentiostat = potentiostat
-        self.results_data = pd.DataFrame(columns= ["time",
-                                                   "potential",
-                                                   "current",
-                                                   "potential_applied"])
+        self.results_data = pd.DataFrame(columns = RESULT_COLUMNS)
         self.file_type = ".csv"
         self.start_potential = settings["start_potential"]
         self.end_potential = settings["end_potential"]
         self.scan_rate = settings["scan_rate"]
         self.step_potential = settings["step_potential"]
+        # Optional settings for the acquisition buffer
+        self.chunk_size = settings.get("chunk_size", 256)
+        self.spool = settings.get("spool", True)
+        self.spool_path = settings.get("spool_path", None)
+        self.keep_in_memory = settings.get("keep_in_memory", True)
+        # Optional settings of the adaptive step mode
+        self.step_mode = settings.get("step_mode", "uniform")
+        if self.step_mode not in ("uniform", "adaptive"):
+            raise ValueError(f"Unknown step mode {self.step_mode}")
+        self.min_step_potential = settings.get("min_step_potential", self.step_potential)
+        self.max_step_potential = settings.get("max_step_potential", 10 * self.step_potential)
+        self.target_current_change = settings.get("target_current_change", 1e-6) #A
+        self.sweep_statistics = {}
+        # Waits for stable current and potential before the sweep instead of a fixed time
+        self.equilibration = Equilibration.from_settings(settings)
+        self.settle_time = None
 
     def measure(self) -> None:
-        
+
+        """ Performs the line sweep and stores the data in results_data."""
+
+        for chunk in self.measure_iter():
+            pass
+
+    def measure_iter(self):
+
+        """ Generator performing the line sweep.
+        Yields every completed chunk of rows (columns as in results_data)
+        while the sweep is running. Chunks are also appended to the spool file
+        unless spooling is switched off in the settings. Closing the generator early
+        aborts the sweep, the rows measured up to then are kept in results_data."""
+
         step_interval = self.step_potential/self.scan_rate
-        potential_to_apply = self.start_potential
-        time_list = []
-        potential_list = []
-        current_list = []
-        potential_applied_list = []
-        start_time = time.time()
+        n_steps = round((self.end_potential- self.start_potential)/self.step_potential)
+        adaptive = self.step_mode == "adaptive"
+        if adaptive: # Upper bound, the sweep ends once the end potential is applied
+            n_steps = math.ceil((self.end_potential - self.start_potential)/self.min_step_potential) + 1
+        spool_path = self.spool_path
+        if self.spool and spool_path is None:
+            spool_file, spool_path = tempfile.mkstemp(prefix = "LineSweep_", suffix = ".spool")
+            os.close(spool_file)
+        buffer = AcquisitionBuffer(RESULT_COLUMNS,
+                                   n_steps,
+                                   chunk_size = self.chunk_size,
+                                   spool_path = spool_path if self.spool else None,
+                                   keep_in_memory = self.keep_in_memory)
+        # Each potential is applied at the absolute time it is reached at the scan rate,
+        # so I/O time does not accumulate and slow down the scan rate
+        scheduler = DeadlineScheduler(step_interval)
 
         if self.potentiostat.instrument.Ei.Cell == False:
-            self.potentiostat.cell_on() #Turn Cell on if necessary
-        time.sleep(5)
-
-        if not self.results_data.empty: # empty results data frame if there is data from a previous measurement
-            self.results_data.drop(self.results_data.index, inplace= True)
-
-        for step in range(round((self.end_potential- self.start_potential)/self.step_potential)):
-            
-            self.potentiostat.set_potential(potential_to_apply)
-            res_potential, res_current, res_applied_potential = self.potentiostat.get_actual_values()
-
-            time_list.append(time.time() - start_time)
-            potential_list.append(res_potential)
-            current_list.append(res_current)
-            potential_applied_list.append(res_applied_potential)
-
-            potential_to_apply += self.step_potential
-            time.sleep(step_interval)
-  
-        self.results_data["time"] = time_list
-        self.results_data["potential"] = potential_list
-        self.results_data["current"] = current_list
-        self.results_data["potential_applied"] = potential_applied_list
-
-        if self.potentiostat.instrument.Ei.Cell == True:
-            self.potentiostat.cell_off() # Turn cell off if necessary
+            with span("cell_on"):
+                self.potentiostat.cell_on() #Turn Cell on if necessary
+        self.potentiostat.set_potential(self.start_potential)
+        with span("equilibration"):
+            self.settle_time = self.equilibration.run(self.potentiostat)
+
+        start_time = scheduler.start()
+        potential = self.start_potential
+        previous = None # Applied potential and current of the previous step
+        try:
+            for step in range(n_steps):
+                
+                if step > 0:
+                    with span("step_wait"):
+                        scheduler.wait_until((potential - self.start_potential)/self.scan_rate)
+                with span("set_potential"):
+                    self.potentiostat.set_potential(potential)
+                read_start = scheduler.clock()
+                with span("get_actual_values"):
+                    res_potential, res_current, res_applied_potential = self.potentiostat.get_actual_values()
+                read_time = 0.5 * (read_start + scheduler.clock()) # Timestamp in the middle of the instrument read
+
+                chunk = buffer.append((read_time - start_time,
+                                       res_potential,
+                                       res_current,
+                                       res_applied_potential))
+                if chunk is not None:
+                    yield chunk
+
+                if not adaptive:
+                    potential = self.start_potential + (step + 1) * self.step_potential
+                elif potential >= self.end_potential:
+                    break
+                else:
+                    step_size = self.adaptive_step_potential(previous, (res_applied_potential, res_current))
+                    previous = (res_applied_potential, res_current)
+                    potential = min(potential + step_size, self.end_potential)
+
+            chunk = buffer.flush()
+            if chunk is not None:
+                yield chunk
+        finally:
+            # Also reached if the sweep is aborted or fails, so no measured rows are lost
+            buffer.flush() # the rows of the last incomplete chunk to the spool file
+            if self.keep_in_memory:
+                self.results_data = buffer.to_dataframe()
+            else: # read back from the spool file only when the data is used
+                self.results_data = DataLoader(spool_path, "csv")
+            self.sweep_statistics = self.calculate_sweep_statistics(scheduler, buffer)
+
+            if self.potentiostat.instrument.Ei.Cell == True:
+                with span("cell_off"):
+                    self.potentiostat.cell_off() # Turn cell off if necessary
     
+    def adaptive_step_potential(self, previous: tuple, current: tuple) -> float:
+
+        """ Step size giving a current change of target_current_change at the dI/dE
+        between the previous and the current step, bounded by the minimum and maximum step.
+        previous and current are (applied potential, current), previous is None on the first step."""
+
+        if previous is None:
+            return self.min_step_potential
+        potential_change = current[0] - previous[0]
+        if potential_change == 0:
+            return self.min_step_potential
+        slope = abs((current[1] - previous[1])/potential_change)
+        if slope == 0:
+            return self.max_step_potential
+        return min(max(self.target_current_change/slope, self.min_step_potential), self.max_step_potential)
+
+    def calculate_sweep_statistics(self, scheduler: DeadlineScheduler, buffer: AcquisitionBuffer) -> dict:
+
+        """ Compares the achieved scan rate of the last sweep with the requested one
+        and adds the step timing of the scheduler."""
+
+        statistics = scheduler.statistics()
+        statistics["settle_time"] = self.settle_time
+        statistics["settled"] = self.equilibration.settled
+        statistics["requested_scan_rate"] = self.scan_rate
+        statistics["achieved_scan_rate"] = float("nan")
+        if len(buffer) > 1:
+            first, last = (dict(zip(buffer.columns, row)) for row in (buffer.first_row, buffer.last_row))
+            statistics["achieved_scan_rate"] = float((last["potential_applied"] - first["potential_applied"])
+                                                      /(last["time"] - first["time"]))
+        return statistics
+
     def save_data(self, save_path: os.PathLike) -> None:
 
-        self.results_data.to_csv(save_path, sep = ",")
+        results_data = self.results_data
+        if isinstance(results_data, DataLoader):
+            results_data = results_data.load()
+        results_data.to_csv(save_path, sep = ",")
 
     def save_experiment(self, file_path: os.PathLike) -> None:
 
@@ -1,27 +1,122 @@
 from Experiments.AbstractExperiment import AbstractExperiment
-from autolab.autolab import Potentiostat
+from Experiments.ProcedureCache import ProcedureCache
+from Experiments.SignalStream import SignalStream
+from Instruments.AbstractInstruments import AbstractPotentiostat
 import os
 import time
+import threading
+from concurrent.futures import Future, CancelledError, InvalidStateError
+from utils.timing import wait_until
+from utils.instrumentation import span
 
 class NovaProcedure(AbstractExperiment):
 
+    """ Experiment Class to measure a Nova procedure (.nox file)
+    with the autolab potentiostat.
+
+    measure blocks until the procedure is finished, measure_async returns a
+    concurrent.futures.Future instead (use asyncio.wrap_future to await it).
+    Cancelling the Future (or the awaiting asyncio task) cancels the measurement.
+    Completion is polled adaptively based on the duration of the previous run.
+    With a procedure cache the .nox file is only loaded if it is not cached yet."""
+
     def __init__(self,
                  procedure_path: os.PathLike,
-                 potenstiostat: Potentiostat):
+                 potenstiostat: AbstractPotentiostat,
+                 procedure_cache: ProcedureCache = None):
 
         self.potentiostat = potenstiostat
-        self.procedure = self.potentiostat.instrument.LoadProcedure(procedure_path)
+        with span("procedure_load"):
+            if procedure_cache is not None:
+                self.procedure = procedure_cache.get(procedure_path)
+            else:
+                self.procedure = self.potentiostat.instrument.LoadProcedure(procedure_path)
         self.file_type = ".nox"
+        self.duration = None # Duration of the last measurement in s
+        self._cancel_event = threading.Event()
+
+    @classmethod
+    def from_settings(cls, potentiostat: AbstractPotentiostat, settings: dict):
+
+        """ Creates the experiment from the experiment_settings of an experiment json file,
+        the procedure is given by the procedure_path setting."""
+
+        return cls(settings["procedure_path"], potentiostat)
     
-    def measure(self) -> None:
+    def measure(self, timeout: float = None) -> None:
+
+        """ Measures the Objects loaded .nox procedure.
+        Raises TimeoutError if it takes longer than timeout seconds
+        and CancelledError if cancel is called, the procedure is aborted in both cases."""
+
+        self._cancel_event.clear()
+        self._measure(timeout)
+
+    def measure_async(self, timeout: float = None) -> Future:
+
+        """ Starts the measurement on a background thread and returns a Future
+        that completes when the procedure is finished. The Future is not marked as
+        running, so it can still be cancelled, which aborts the procedure like cancel."""
+
+        self._cancel_event.clear() # before the thread starts, so an early cancel is not lost
+        future = Future()
+        future.add_done_callback(lambda future: self.cancel() if future.cancelled() else None)
 
-        """ Measures the Objects loaded .nox procedure"""
+        def run() -> None:
+            try:
+                self._measure(timeout)
+            except BaseException as error:
+                complete, value = future.set_exception, error
+            else:
+                complete, value = future.set_result, None
+            try:
+                complete(value)
+            except InvalidStateError:
+                pass # the Future was cancelled meanwhile
+
+        threading.Thread(target = run, daemon = True).start()
+        return future
+
+    def _measure(self, timeout: float = None) -> None:
+        start_time = time.perf_counter()
+        try:
+            with span("procedure_measure"):
+                self.procedure.Measure()
+                wait_until(lambda: not self.procedure.IsMeasuring,
+                           timeout = timeout,
+                           expected_duration = self.duration,
+                           cancel_event = self._cancel_event)
+        except (TimeoutError, CancelledError):
+            self.abort()
+            raise
+        self.duration = time.perf_counter() - start_time
+
+    def measure_stream(self,
+                       command_name: str,
+                       names: list = None,
+                       poll_interval: float = 0.1) -> SignalStream:
+
+        """ Starts the measurement and returns a SignalStream of the given command.
+        Iterating over it yields the newly acquired points until the procedure is finished."""
 
         self.procedure.Measure()
-        while self.procedure.IsMeasuring:
-            time.sleep(0.1)
+        return SignalStream(self.procedure, command_name, names, poll_interval)
+
+    def cancel(self) -> None:
+
+        """ Cancels a running measure or measure_async call."""
+
+        self._cancel_event.set()
+
+    def abort(self) -> None:
+
+        """ Stops the procedure on the instrument if the SDK supports aborting."""
+
+        if hasattr(self.procedure, "Abort"):
+            self.procedure.Abort()
 
     def save_data(self, save_path: os.PathLike) -> None:
         
         """ Saves the .nox procedure to given file path"""
-        self.procedure.SaveAs(save_path)
\ No newline at end of file
+        with span("procedure_save"):
+            self.procedure.SaveAs(save_path)
\ No newline at end of file
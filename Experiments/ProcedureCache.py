@@ -0,0 +1,65 @@
+import os
+import threading
+from collections import OrderedDict
+
+class ProcedureCache:
+
+    """ LRU cache of Nova procedures loaded on a potentiostat.
+
+    Procedures are keyed by their absolute path and the modification time of the
+    .nox file, so an edited procedure is loaded again. A cached procedure object is
+    handed out again for repeated measurements. Before that the reset hook is called
+    on it (reset_procedure by default), so every caller gets a procedure without the
+    data and state of the previous run. Data of a run therefore has to be saved before
+    get is called again for the same procedure; procedures that are still measuring
+    are not handed out."""
+
+    def __init__(self, potentiostat, max_size: int = 8, reset = None) -> None:
+        self.potentiostat = potentiostat
+        self.max_size = max_size
+        # Called with a cached procedure before it is handed out again
+        self.reset = reset if reset is not None else reset_procedure
+        self.hits = 0
+        self.misses = 0
+        self._procedures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, procedure_path: os.PathLike):
+
+        """ Returns the loaded procedure, loading it only if it is not cached
+        or the file changed since it was loaded."""
+
+        path = os.path.abspath(procedure_path)
+        key = (path, os.path.getmtime(path) if os.path.exists(path) else None)
+
+        with self._lock:
+            procedure = self._procedures.get(key)
+            if procedure is not None:
+                if procedure.IsMeasuring:
+                    raise RuntimeError(f"Procedure {procedure_path} is still measuring")
+                self.reset(procedure)
+                self._procedures.move_to_end(key)
+                self.hits += 1
+                return procedure
+
+            self.misses += 1
+            for cached_key in [cached_key for cached_key in self._procedures if cached_key[0] == path]:
+                del self._procedures[cached_key] # outdated version of the same file
+            procedure = self.potentiostat.instrument.LoadProcedure(procedure_path)
+            self._procedures[key] = procedure
+            while len(self._procedures) > self.max_size:
+                self._procedures.popitem(last = False) # evict the least recently used procedure
+            return procedure
+
+    def clear(self) -> None:
+        with self._lock:
+            self._procedures.clear()
+
+def reset_procedure(procedure) -> None:
+
+    """ Default reset hook of the ProcedureCache: calls Reset of the procedure if it has one
+    (the SimulatedProcedure does). Nova procedures clear their signals when Measure starts."""
+
+    reset = getattr(procedure, "Reset", None)
+    if reset is not None:
+        reset()
@@ -0,0 +1,69 @@
+import time
+import numpy as np
+
+class SignalStream:
+
+    """ Streams the signals of a Nova procedure command while it is measuring.
+
+    Every poll only the points acquired since the previous poll are converted to
+    NumPy arrays, by index into the signal values, so the history is never copied again.
+    Iterating over the stream yields these chunks as dicts of signal name to array
+    until the procedure has finished, and passes each chunk to the subscribers
+    (e.g. a live plot, an early stopping rule or the agent).
+    The chunks of all signals have the same length."""
+
+    def __init__(self,
+                 procedure,
+                 command_name: str,
+                 names: list = None,
+                 poll_interval: float = 0.1) -> None:
+
+        self.procedure = procedure
+        self.command = procedure.Commands[command_name]
+        self.names = list(names if names is not None else self.command.Signals.Names)
+        self.poll_interval = poll_interval
+        self.points_read = 0
+        self.subscribers = []
+
+    def subscribe(self, callback) -> None:
+
+        """ Registers a callback that is called with every new chunk."""
+
+        self.subscribers.append(callback)
+
+    def read_new(self) -> dict:
+
+        """ Reads the points acquired since the last read.
+        Returns None if there are no new points."""
+
+        values = [self.command.Signals.get_Item(name).Value for name in self.names]
+        available = min(len(value) for value in values) if values else 0
+        if available <= self.points_read:
+            return None
+
+        start, self.points_read = self.points_read, available
+        chunk = {name: np.fromiter((value[i] for i in range(start, available)),
+                                   dtype = float,
+                                   count = available - start)
+                 for name, value in zip(self.names, values)}
+        for callback in self.subscribers:
+            callback(chunk)
+        return chunk
+
+    def __iter__(self):
+        while self.procedure.IsMeasuring:
+            chunk = self.read_new()
+            if chunk is not None:
+                yield chunk
+            time.sleep(self.poll_interval)
+
+        chunk = self.read_new() # points acquired between the last poll and the end
+        if chunk is not None:
+            yield chunk
+
+    def run(self) -> None:
+
+        """ Streams until the procedure has finished, for use with subscribers only."""
+
+        for _ in self:
+            pass
@@ -1,3 +1,7 @@
 from .AbstractExperiment import *
+from .AcquisitionBuffer import *
+from .Equilibration import *
+from .ProcedureCache import *
+from .SignalStream import *
 from .LineSweep import *
 from .NovaProcedure import *
\ No newline at end of file
@@ -1,18 +1,88 @@
-from FileManager import FileManager
 from dataclasses import dataclass, field
 from datetime import datetime
 import os
 import csv
+import json
+import numpy as np
 import pandas as pd
+from utils.instrumentation import timed
+
+# File extension of each supported file format
+FILE_FORMATS = {"csv": ".csv",
+                "feather": ".feather",
+                "npz": ".npz"}
+# Keys of the metadata block at the start of a SECM CSV file, in the order they are written
+CSV_METADATA_KEYS = ("Experiment Name",
+                     "Experiment Id",
+                     "Substrate Material",
+                     "Batch Id",
+                     "Ai Model",
+                     "Ai Model Id",
+                     "Substrate Coordinates",
+                     "Date")
+
+class DataLoader:
+
+    """ Deferred read of the data table of a SECM data file.
+    For CSV files offset is the byte position where the table starts."""
+
+    def __init__(self, file_path: os.PathLike, file_format: str,
+                 offset: int = 0, columns: list = None) -> None:
+        self.file_path = file_path
+        self.file_format = file_format
+        self.offset = offset
+        self.columns = columns
+
+    @timed("datafile_read")
+    def load(self) -> pd.DataFrame:
+
+        if self.file_format == "feather":
+            from pyarrow import feather
+
+            return feather.read_table(self.file_path, columns = self.columns, memory_map = True).to_pandas()
+
+        if self.file_format == "npz":
+            with np.load(self.file_path) as npz_file:
+                names = self.columns if self.columns is not None else [name for name in npz_file.files if name != "__metadata__"]
+                return pd.DataFrame({name: npz_file[name] for name in names})
+
+        with open(self.file_path, 'rb') as csv_file:
+            csv_file.seek(self.offset) # skip the metadata block
+            return pd.read_csv(csv_file, sep = ',', usecols = self.columns)
+
+class LazyData:
+
+    """ Descriptor for the data attribute of SECMDataFile.
+    If a DataLoader is assigned the table is only read on first access."""
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = "_" + name
+
+    def __get__(self, instance, owner = None):
+        if instance is None:
+            raise AttributeError(self.name) # The dataclass field has no default value
+        value = instance.__dict__[self.name]
+        if isinstance(value, DataLoader):
+            value = value.load()
+            instance.__dict__[self.name] = value
+        return value
+
+    def __set__(self, instance, value) -> None:
+        instance.__dict__[self.name] = value
 
 @dataclass
 class SECMDataFile:
 
     """ Dataclass for an SECM experiment
-    containing the dataset aswell as the metadata for it."""
+    containing the dataset aswell as the metadata for it.
+
+    Can be stored as CSV (human readable), Feather (Arrow IPC, memory mapped
+    column reads, needs pyarrow) or NPZ (NumPy only, column reads without
+    memory mapping). The binary formats keep the metadata embedded in the file.
+    The data can be given as a DataLoader, it is then read on first access."""
 
     file_path: os.PathLike
-    data: pd.DataFrame
+    data: pd.DataFrame = LazyData()
     experiment_name: str
     experiment_id: str
     substrate_material: str
@@ -23,25 +93,40 @@ class SECMDataFile:
     date: str = str(datetime.now().replace(microsecond=0))
     
 
+    def metadata(self) -> dict:
+
+        """ Returns the metadata of the experiment as a dictionary."""
+
+        return {"experiment_name": self.experiment_name,
+                "experiment_id": self.experiment_id,
+                "substrate_material": self.substrate_material,
+                "batch_id": self.batch_id,
+                "ai_model": self.ai_model,
+                "ai_model_id": self.ai_model_id,
+                "coordinates": self.coordinates,
+                "date": self.date}
+
+    @timed("datafile_write")
+    def write(self, file_format: str = "csv") -> None:
+
+        """ Writes the data in the given file format. For the binary formats
+        the extension of file_path is replaced by the one of the format."""
+
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"Unknown file format {file_format}, use one of {list(FILE_FORMATS)}")
+        if file_format != "csv":
+            self.file_path = os.path.splitext(self.file_path)[0] + FILE_FORMATS[file_format]
+        getattr(self, f"write_to_{file_format}")()
+
     def write_to_csv(self) -> None:
 
         """ Writes the data to a CSV file at the specified file path."""
 
-        if os.path.isfile(self.file_path): #Check if the file already exists so not to overwrite existing data
-            print ("File already exists")
-            return
-        
-        with open(self.file_path, 'w',newline='') as csv_file:
+        with open(self.file_path, 'x',newline='') as csv_file: #Raises FileExistsError so existing data is not overwritten
             writer = csv.writer(csv_file) # Write the CSV file header
 
-            writer.writerow(("Experiment Name", self.experiment_name))
-            writer.writerow(("Experiment Id", self.experiment_id))
-            writer.writerow(("Substrate Material", self.substrate_material))
-            writer.writerow(("Batch Id", self.batch_id))
-            writer.writerow(("Ai Model", self.ai_model))
-            writer.writerow(("Ai Model Id", self.ai_model_id))
-            writer.writerow(("Substrate Coordinates", self.coordinates))
-            writer.writerow(("Date", self.date))
+            for key, value in zip(CSV_METADATA_KEYS, self.metadata().values()):
+                writer.writerow((key, value))
             writer.writerow(())
 
         self.data.to_csv(self.file_path,
@@ -49,19 +134,111 @@ class SECMDataFile:
                          mode = "a",
                          header = True) #appends the data to the CSV file.
 
-def parse_secm_datafile(file_path) -> SECMDataFile:
+    def write_to_feather(self) -> None:
 
-    """Reads the SECM Data into a SECMDataFile object."""
+        """ Writes the data to an uncompressed Feather file with the metadata
+        stored in the schema, so columns can be memory mapped when reading."""
 
-    with open(file_path, 'r', newline= '') as csv_file:
-        reader = csv.reader(csv_file)
+        import pyarrow
+        from pyarrow import feather
 
-        attributes = []
-        for line in reader: #collects alls attributes from the csv file in a list
-            if line == []:
-                break
-            attributes.append(line[1])
-    #TODO: Remove the magic number somehow
-    dataframe = pd.read_csv(file_path, sep = ',', skiprows= 9) # get the data from the file to a dataframe
-    
-    return SECMDataFile(file_path, dataframe, *attributes)
\ No newline at end of file
+        if os.path.isfile(self.file_path): #Check if the file already exists so not to overwrite existing data
+            raise FileExistsError(f"File already exists: {self.file_path}")
+
+        table = pyarrow.Table.from_pandas(self.data)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b"secm_metadata": json.dumps(self.metadata())})
+        feather.write_feather(table, self.file_path, compression = "uncompressed")
+
+    def write_to_npz(self) -> None:
+
+        """ Writes every column as an array to an uncompressed NPZ file,
+        the metadata is stored as JSON string under the key __metadata__."""
+
+        if os.path.isfile(self.file_path): #Check if the file already exists so not to overwrite existing data
+            raise FileExistsError(f"File already exists: {self.file_path}")
+
+        columns = {str(column): self.data[column].to_numpy() for column in self.data.columns}
+        np.savez(self.file_path, __metadata__ = np.array(json.dumps(self.metadata())), **columns)
+
+@timed("datafile_parse_metadata")
+def parse_secm_datafile(file_path, file_format: str = None, columns: list = None) -> SECMDataFile:
+
+    """Reads the metadata of a SECM data file into a SECMDataFile object.
+    Only the metadata block is read, the data is read from the file on first access
+    of the data attribute. The file format is taken from the file extension
+    if it is not given. If columns is given only these columns of the data are read."""
+
+    if file_format is None:
+        file_format = file_format_from_path(file_path)
+
+    if file_format == "feather":
+        import pyarrow
+
+        with pyarrow.memory_map(str(file_path)) as source: # only the schema is read
+            metadata = json.loads(pyarrow.ipc.open_file(source).schema.metadata[b"secm_metadata"])
+        return SECMDataFile(file_path, DataLoader(file_path, file_format, columns = columns), **metadata)
+
+    if file_format == "npz":
+        with np.load(file_path) as npz_file:
+            metadata = json.loads(str(npz_file["__metadata__"]))
+        return SECMDataFile(file_path, DataLoader(file_path, file_format, columns = columns), **metadata)
+
+    attributes, offset = read_csv_metadata(file_path)
+    return SECMDataFile(file_path, DataLoader(file_path, file_format, offset, columns), *attributes)
+
+def read_csv_metadata(file_path: os.PathLike) -> tuple:
+
+    """Reads the metadata block of a SECM CSV file in one pass.
+    Returns the attributes and the byte offset at which the data table starts.
+    Only the lines of the metadata keys and the empty line after them are read,
+    raises ValueError if the file does not start with this block (e.g. a plain data table)."""
+
+    attributes = []
+    with open(file_path, 'rb') as csv_file:
+        for key in CSV_METADATA_KEYS:
+            row = next(csv.reader([csv_file.readline().decode().rstrip("\r\n")]), [])
+            if len(row) != 2 or row[0] != key:
+                raise ValueError(f"{file_path} is not a SECM data file, expected the metadata key {key!r}")
+            attributes.append(row[1])
+        if csv_file.readline().strip() != b"": # the empty line ending the metadata block
+            raise ValueError(f"{file_path} is not a SECM data file, the metadata block does not end after {key!r}")
+        offset = csv_file.tell()
+    return attributes, offset
+
+def file_format_from_path(file_path: os.PathLike) -> str:
+
+    """Returns the file format belonging to the extension of the file path."""
+
+    extension = os.path.splitext(file_path)[1].lower()
+    for file_format, format_extension in FILE_FORMATS.items():
+        if extension == format_extension:
+            return file_format
+    raise ValueError(f"Unknown file extension {extension}")
+
+def convert_datafile(file_path: os.PathLike, file_format: str = "feather") -> str:
+
+    """Converts a SECM data file to the given file format
+    and returns the path of the converted file."""
+
+    datafile = parse_secm_datafile(file_path)
+    datafile.write(file_format)
+    return datafile.file_path
+
+def convert_archive(root_path: os.PathLike, file_format: str = "feather") -> list:
+
+    """Converts all SECM CSV data files below root_path to the given file format.
+    Files that were already converted are skipped. Returns the paths of the new files."""
+
+    converted = []
+    for folder_path, _, file_names in os.walk(root_path):
+        for file_name in file_names:
+            file_path = os.path.join(folder_path, file_name)
+            target_path = os.path.splitext(file_path)[0] + FILE_FORMATS[file_format]
+            if not file_name.endswith(".csv") or os.path.exists(target_path):
+                continue
+            with open(file_path, 'r', newline= '') as csv_file:
+                if not csv_file.readline().startswith("Experiment Name"): # Not a SECM data file
+                    continue
+            converted.append(convert_datafile(file_path, file_format))
+    return converted
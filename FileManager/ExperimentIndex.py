@@ -0,0 +1,221 @@
+import os
+import re
+import ast
+import sqlite3
+import argparse
+import threading
+
+INDEX_FILE_NAME = "experiment_index.sqlite"
+# batchid_experimentnumber_experimentname.extension as generated by FileManager.generate_file_name
+FILE_NAME_PATTERN = re.compile(r"^(\d+)_(\d+)_(\w+)\.(csv|feather|npz|nox)$")
+
+class ExperimentIndex:
+
+    """ Persistent SQLite index of the experiments saved below a FileManager root path.
+
+    Every saved experiment is recorded with its batch id, experiment number,
+    experiment class, AI model, substrate coordinates and file path, so experiments
+    can be found without walking the folder structure.
+    The rebuild method brings the index up to date with the files on disk,
+    only reading files whose modification time changed."""
+
+    def __init__(self, index_path: os.PathLike) -> None:
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(index_path, timeout = 30, check_same_thread = False)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS experiments (
+                                           file_path TEXT PRIMARY KEY,
+                                           batch_id INTEGER,
+                                           experiment_number INTEGER,
+                                           experiment_class TEXT,
+                                           experiment_name TEXT,
+                                           experiment_id TEXT,
+                                           ai_model TEXT,
+                                           x REAL,
+                                           y REAL,
+                                           date TEXT,
+                                           mtime REAL)""")
+            self.connection.execute("""CREATE INDEX IF NOT EXISTS experiments_batch
+                                       ON experiments (batch_id, experiment_class, experiment_number)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS experiments_position ON experiments (x, y)")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS counters (
+                                           batch_id INTEGER PRIMARY KEY,
+                                           next_number INTEGER)""")
+
+    def add(self,
+            file_path: os.PathLike,
+            batch_id: int,
+            experiment_number: int,
+            experiment_class: str,
+            experiment_name: str = None,
+            experiment_id: str = None,
+            ai_model: str = None,
+            coordinates: list = None,
+            date: str = None) -> None:
+
+        """ Adds an experiment file to the index or updates its entry."""
+
+        x, y = parse_coordinates(coordinates)
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO experiments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (os.path.abspath(file_path), batch_id, experiment_number, experiment_class,
+                                     experiment_name, experiment_id, ai_model, x, y, date,
+                                     os.path.getmtime(file_path)))
+
+    def add_file(self, file_path: os.PathLike) -> bool:
+
+        """ Adds a file saved by the FileManager to the index, reading the metadata
+        of SECM data files from their header. Files without a SECM metadata block
+        (e.g. plain CSV tables written by LineSweep.save_data) are indexed by their
+        name only. Returns False if the file name does not follow the FileManager naming scheme."""
+
+        from FileManager.DataFile import parse_secm_datafile
+
+        match = FILE_NAME_PATTERN.match(os.path.basename(file_path))
+        if match is None:
+            return False
+        batch_id, experiment_number, experiment_class, extension = match.groups()
+
+        metadata = {}
+        if extension != "nox": # Nova procedures carry no SECM metadata
+            try:
+                metadata = parse_secm_datafile(file_path).metadata()
+            except (ValueError, KeyError, IndexError, TypeError, OSError):
+                pass # Not a SECM data file or metadata that does not fit SECMDataFile, index it by its name only
+        self.add(file_path,
+                 int(batch_id),
+                 int(experiment_number),
+                 experiment_class,
+                 experiment_name = metadata.get("experiment_name"),
+                 experiment_id = metadata.get("experiment_id"),
+                 ai_model = metadata.get("ai_model"),
+                 coordinates = metadata.get("coordinates"),
+                 date = metadata.get("date"))
+        return True
+
+    def reserve_experiment_number(self, batch_id: int) -> int:
+
+        """ Atomically reserves the next experiment number of a batch.
+        The counter lives in the index database, so concurrent runs on the same
+        root path never get the same number. A new counter continues after the
+        highest experiment number of the batch already in the index."""
+
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE") # lock the database for other processes
+            try:
+                row = self.connection.execute("SELECT next_number FROM counters WHERE batch_id = ?",
+                                              (batch_id,)).fetchone()
+                if row is None:
+                    row = self.connection.execute("""SELECT COALESCE(MAX(experiment_number), 0) + 1
+                                                     FROM experiments WHERE batch_id = ?""", (batch_id,)).fetchone()
+                experiment_number = row[0]
+                self.connection.execute("INSERT OR REPLACE INTO counters VALUES (?, ?)",
+                                        (batch_id, experiment_number + 1))
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+        return experiment_number
+
+    def query(self,
+              batch_id: int = None,
+              experiment_class: str = None,
+              ai_model: str = None,
+              x_range: tuple = None,
+              y_range: tuple = None) -> list:
+
+        """ Returns the entries matching all given criteria as a list of dicts,
+        ordered by batch id and experiment number.
+        x_range and y_range are (minimum, maximum) of the substrate coordinates."""
+
+        conditions, parameters = [], []
+        for column, value in (("batch_id", batch_id),
+                              ("experiment_class", experiment_class),
+                              ("ai_model", ai_model)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        for column, value_range in (("x", x_range), ("y", y_range)):
+            if value_range is not None:
+                conditions.append(f"{column} BETWEEN ? AND ?")
+                parameters.extend(value_range)
+
+        statement = "SELECT * FROM experiments"
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+        statement += " ORDER BY batch_id, experiment_number"
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(statement, parameters)]
+
+    def rebuild(self, root_path: os.PathLike) -> dict:
+
+        """ Scans root_path and updates the index incrementally.
+        Files with an unchanged modification time are skipped, entries of
+        deleted files are removed. Returns the number of added, updated and removed entries."""
+
+        with self.lock:
+            known = dict(self.connection.execute("SELECT file_path, mtime FROM experiments").fetchall())
+        counts = {"added": 0, "updated": 0, "removed": 0}
+
+        for folder_path, _, file_names in os.walk(root_path):
+            for file_name in file_names:
+                file_path = os.path.abspath(os.path.join(folder_path, file_name))
+                mtime = known.pop(file_path, None)
+                if mtime is not None and mtime == os.path.getmtime(file_path):
+                    continue
+                if self.add_file(file_path):
+                    counts["added" if mtime is None else "updated"] += 1
+
+        with self.lock, self.connection: # whatever is left in known was deleted from disk
+            self.connection.executemany("DELETE FROM experiments WHERE file_path = ?",
+                                        [(file_path,) for file_path in known])
+        counts["removed"] = len(known)
+        return counts
+
+    def close(self) -> None:
+        self.connection.close()
+
+def parse_coordinates(coordinates) -> tuple:
+
+    """ Returns x and y from coordinates given as list or as string read from a CSV header.
+    Coordinates that can not be read (e.g. "spot A3") give None, None."""
+
+    try:
+        if isinstance(coordinates, str):
+            coordinates = ast.literal_eval(coordinates) if coordinates.strip() else None
+        if not coordinates:
+            return None, None
+        return float(coordinates[0]), float(coordinates[1])
+    except (ValueError, SyntaxError, TypeError, IndexError):
+        return None, None
+
+def main() -> None:
+
+    """ Command line interface to rebuild and query the index of a FileManager root path."""
+
+    parser = argparse.ArgumentParser(description = "Experiment index of a FileManager root path")
+    parser.add_argument("command", choices = ["rebuild", "query"])
+    parser.add_argument("root_path")
+    parser.add_argument("--batch-id", type = int)
+    parser.add_argument("--experiment-class")
+    parser.add_argument("--ai-model")
+    parser.add_argument("--x-range", type = float, nargs = 2)
+    parser.add_argument("--y-range", type = float, nargs = 2)
+    arguments = parser.parse_args()
+
+    index = ExperimentIndex(os.path.join(arguments.root_path, INDEX_FILE_NAME))
+    if arguments.command == "rebuild":
+        print(index.rebuild(arguments.root_path))
+    else:
+        for entry in index.query(arguments.batch_id,
+                                 arguments.experiment_class,
+                                 arguments.ai_model,
+                                 arguments.x_range,
+                                 arguments.y_range):
+            print(entry["file_path"])
+    index.close()
+
+if __name__ == "__main__":
+    main()
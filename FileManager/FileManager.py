@@ -1,5 +1,7 @@
 import os 
 from Experiments.AbstractExperiment import AbstractExperiment
+from FileManager.ExperimentIndex import ExperimentIndex, INDEX_FILE_NAME
+from utils.instrumentation import span
 
 class FileManager:
 
@@ -13,10 +15,25 @@ class FileManager:
             batchid_experimentnumber_ experimentname.csv
         AI Experiment
            AI Model
-              batchid_experimentnumber_ experimentname.csv """
+              batchid_experimentnumber_ experimentname.csv
+        experiment_index.sqlite
+      
+    Saved experiments are recorded in the experiment index for fast queries. """
 
     def __init__(self, root_save_path: os.PathLike):
         self.root_path = root_save_path
+        self._index = None
+        self._created_folders = set() # folders known to exist, checked only once
+
+    @property
+    def index(self) -> ExperimentIndex:
+
+        """ The experiment index of the root save path, opened on first use."""
+
+        if self._index is None:
+            self.check_create_folder(self.root_path)
+            self._index = ExperimentIndex(os.path.join(self.root_path, INDEX_FILE_NAME))
+        return self._index
     
     def generate_file_name(self,
                            batch_id: int,
@@ -54,12 +71,71 @@ class FileManager:
         """Check if the given path is a directory. 
         If it does not exist it creates the folder.
         Returns a human readable string, spefifying 
-        if the folder exists or was created"""
+        if the folder exists or was created.
+        Folders that were checked before are not looked up on disk again."""
+
+        if folder_path in self._created_folders:
+            return "folder exists"
 
         if os.path.exists(folder_path): # checks if directory exists
+            self._created_folders.add(folder_path)
             return "folder exists" # directory exists already therefore exit the method
         
         else:
-            os.makedirs(folder_path) # create directory at given path
+            os.makedirs(folder_path, exist_ok = True) # create directory at given path
+            self._created_folders.add(folder_path)
             return "folder was created"
-    
+
+    def allocate_file_path(self,
+                           batch_id: int,
+                           experiment: AbstractExperiment) -> tuple:
+
+        """Reserves the next experiment number of the batch and returns it
+        together with the file path for the experiment. The folder is created if necessary.
+        Numbers come from a counter in the experiment index, so the folder is not listed
+        and runs sharing the root save path never get the same number."""
+
+        with span("allocate_file_path"):
+            experiment_number = self.index.reserve_experiment_number(batch_id)
+            folder_path = self.generate_folder_path(experiment)
+            self.check_create_folder(folder_path)
+        file_name = self.generate_file_name(batch_id, experiment_number, experiment)
+        return experiment_number, os.path.join(folder_path, file_name)
+
+    def save_datafile(self, datafile, file_format: str = "csv",
+                      experiment: AbstractExperiment = None) -> str:
+
+        """Writes a SECMDataFile in the given file format and adds it to the
+        experiment index. Returns the path of the written file.
+        If the experiment is given the file path is allocated with the next free
+        experiment number of the batch of the data file, taking the next number
+        whenever a file of that name already exists. Without it an existing file
+        raises a FileExistsError, data is never silently dropped."""
+
+        while True:
+            if experiment is not None:
+                _, datafile.file_path = self.allocate_file_path(int(datafile.batch_id), experiment)
+            try:
+                datafile.write(file_format)
+                break
+            except FileExistsError:
+                if experiment is None:
+                    raise
+        with span("index_update"):
+            self.index.add_file(datafile.file_path)
+        return datafile.file_path
+
+    def register_file(self, file_path: os.PathLike) -> None:
+
+        """Adds a file saved by an experiment itself, e.g. a .nox procedure,
+        to the experiment index."""
+
+        with span("index_update"):
+            self.index.add_file(file_path)
+
+    def rebuild_index(self) -> dict:
+
+        """Brings the experiment index up to date with the files below the root save path,
+        only rereading files that changed since the last rebuild."""
+
+        return self.index.rebuild(self.root_path)
@@ -1,2 +1,3 @@
 from .DataFile import *
+from .ExperimentIndex import *
 from .FileManager import *
\ No newline at end of file
@@ -0,0 +1,42 @@
+import abc
+from abc import ABC
+
+
+class AbstractPotentiostat(ABC):
+
+    """ Interface of the potentiostat used by the experiments and the environment.
+    Besides these methods implementations provide an instrument attribute with
+    instrument.Ei.Cell (cell state) and instrument.LoadProcedure(procedure_path)."""
+
+    @abc.abstractmethod
+    def set_potential(self, potential: float):
+        ...
+
+    @abc.abstractmethod
+    def get_actual_values(self) -> tuple:
+        ...
+
+    @abc.abstractmethod
+    def cell_on(self):
+        ...
+
+    @abc.abstractmethod
+    def cell_off(self):
+        ...
+
+
+class AbstractSecm(ABC):
+
+    """ Interface of the SECM positioning system."""
+
+    @abc.abstractmethod
+    def new_substrate(self):
+        ...
+
+    @abc.abstractmethod
+    def prepare_next_experiment(self, distance: float):
+        ...
+
+    @abc.abstractmethod
+    def move_to_wash(self):
+        ...
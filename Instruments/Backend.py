@@ -0,0 +1,20 @@
+from Instruments.AbstractInstruments import AbstractPotentiostat, AbstractSecm
+from Instruments.SimulatedPotentiostat import SimulatedPotentiostat
+from Instruments.SimulatedSecm import SimulatedSecm
+
+def load_instruments(config: dict) -> tuple:
+
+    """ Returns the potentiostat and the SECM selected by the autolab config.
+    With "sim" set the simulated instruments are used with the "sim_settings",
+    otherwise the autolab and secm packages (Windows only) are imported."""
+
+    if config.get("sim", False):
+        settings = config.get("sim_settings", {})
+        return SimulatedPotentiostat(settings), SimulatedSecm(settings)
+
+    from autolab import Potentiostat
+    from secm import SECM
+
+    AbstractPotentiostat.register(Potentiostat)
+    AbstractSecm.register(SECM)
+    return Potentiostat(config = config), SECM()
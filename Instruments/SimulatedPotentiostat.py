@@ -0,0 +1,156 @@
+import time
+import numpy as np
+from types import SimpleNamespace
+from Instruments.AbstractInstruments import AbstractPotentiostat
+
+class SimulatedPotentiostat(AbstractPotentiostat):
+
+    """ In-process stand-in for the autolab Potentiostat.
+
+    The electrochemical response comes from the ElectrodeModel, every call to the
+    instrument waits the configured latency. Nova procedures are simulated as a
+    cyclic voltammogram through the same model, see SimulatedProcedure.
+
+    Settings (the sim_settings of the autolab config):
+        latency: seconds every instrument call takes
+        current_noise: standard deviation of the current noise in A
+        potential_noise: standard deviation of the potential noise in V
+        seed: seed of the noise, null for a random seed
+        electrode: keyword arguments of the ElectrodeModel
+        procedure_duration, procedure_points, procedure_start,
+        procedure_vertex: see SimulatedProcedure"""
+
+    def __init__(self, settings: dict = None) -> None:
+        # Imported here, the Ai package loads gymnasium, which analysis-only tools importing Instruments do not need
+        from Ai.ElectrodeModel import ElectrodeModel
+
+        self.settings = settings if settings is not None else {}
+        self.latency = self.settings.get("latency", 0.0)
+        self.model = ElectrodeModel(current_noise = self.settings.get("current_noise", 1e-9),
+                                    potential_noise = self.settings.get("potential_noise", 1e-4),
+                                    **self.settings.get("electrode", {}))
+        self.rng = np.random.default_rng(self.settings.get("seed"))
+        self.instrument = SimulatedInstrument(self)
+        self._last_set_time = time.perf_counter()
+
+    def set_potential(self, potential: float) -> None:
+        self._wait()
+        now = time.perf_counter()
+        self.model.apply(potential, now - self._last_set_time)
+        self._last_set_time = now
+
+    def get_actual_values(self) -> tuple:
+        self._wait()
+        potential, current, applied_potential = self.model.read(self.rng)
+        if not self.instrument.Ei.Cell: # no current flows with the cell switched off
+            return float(applied_potential[0]), 0.0, float(applied_potential[0])
+        return float(potential[0]), float(current[0]), float(applied_potential[0])
+
+    def cell_on(self) -> None:
+        self._wait()
+        self.instrument.Ei.Cell = True
+
+    def cell_off(self) -> None:
+        self._wait()
+        self.instrument.Ei.Cell = False
+
+    def _wait(self) -> None:
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+class SimulatedInstrument:
+
+    """ The instrument attribute of the SimulatedPotentiostat."""
+
+    def __init__(self, potentiostat: SimulatedPotentiostat) -> None:
+        self.potentiostat = potentiostat
+        self.Ei = SimpleNamespace(Cell = False)
+
+    def LoadProcedure(self, procedure_path):
+        self.potentiostat._wait()
+        return SimulatedProcedure(self.potentiostat, procedure_path)
+
+class SimulatedProcedure:
+
+    """ Simulated Nova procedure measuring a single cyclic voltammogram.
+
+    The sweep goes from procedure_start to procedure_vertex and back
+    with procedure_points points in procedure_duration seconds. Every command name
+    gives access to the same signals (the names used by Overpotential.nox).
+    While measuring the signals only contain the points acquired so far."""
+
+    def __init__(self, potentiostat: SimulatedPotentiostat, procedure_path) -> None:
+        self.potentiostat = potentiostat
+        self.procedure_path = procedure_path
+        self.start = potentiostat.settings.get("procedure_start", 0.2)
+        self.vertex = potentiostat.settings.get("procedure_vertex", 0.7)
+        self.Commands = SimulatedCommands(self)
+        self.Reset()
+
+    def Reset(self) -> None:
+
+        """ Clears the signals and undoes an Abort, as before the first Measure."""
+
+        self.duration = self.potentiostat.settings.get("procedure_duration", 5.0)
+        self.points = self.potentiostat.settings.get("procedure_points", 500)
+        self.signals = {}
+        self._start_time = None
+
+    def Measure(self) -> None:
+        model = self.potentiostat.model
+        half = self.points//2
+        potential = np.concatenate((np.linspace(self.start, self.vertex, half),
+                                    np.linspace(self.vertex, self.start, self.points - half)))
+        current = model.faradaic_current(potential) + self.potentiostat.rng.normal(0, model.current_noise, self.points)
+        self.signals = {"Time": np.linspace(0, self.duration, self.points),
+                        "Potential applied": potential,
+                        "WE(1).Current": current,
+                        "Index": np.arange(self.points, dtype = float),
+                        "Scan": np.ones(self.points)}
+        self._start_time = time.perf_counter()
+
+    @property
+    def IsMeasuring(self) -> bool:
+        return self._start_time is not None and time.perf_counter() - self._start_time < self.duration
+
+    def acquired_points(self) -> int:
+        if self._start_time is None:
+            return 0
+        elapsed = time.perf_counter() - self._start_time
+        return min(self.points, int(self.points * elapsed/self.duration)) if self.duration > 0 else self.points
+
+    def Abort(self) -> None:
+        # Count the points acquired so far before the duration is cut short
+        self.points = self.acquired_points()
+        self.duration = time.perf_counter() - self._start_time if self._start_time is not None else 0.0
+
+    def SaveAs(self, file_path) -> None:
+
+        """ Saves the signals as CSV, the simulation can not write .nox files."""
+
+        n = self.acquired_points()
+        np.savetxt(file_path,
+                   np.column_stack([values[:n] for values in self.signals.values()]),
+                   delimiter = ",",
+                   header = ",".join(self.signals),
+                   comments = "")
+
+class SimulatedCommands:
+
+    def __init__(self, procedure: SimulatedProcedure) -> None:
+        self.procedure = procedure
+
+    def __getitem__(self, command_name: str) -> SimpleNamespace:
+        return SimpleNamespace(Signals = SimulatedSignals(self.procedure))
+
+class SimulatedSignals:
+
+    def __init__(self, procedure: SimulatedProcedure) -> None:
+        self.procedure = procedure
+
+    @property
+    def Names(self) -> list:
+        return list(self.procedure.signals)
+
+    def get_Item(self, name: str) -> SimpleNamespace:
+        return SimpleNamespace(Value = self.procedure.signals[name][:self.procedure.acquired_points()])
@@ -0,0 +1,38 @@
+import time
+from Instruments.AbstractInstruments import AbstractSecm
+
+class SimulatedSecm(AbstractSecm):
+
+    """ In-process stand-in for the SECM positioning system.
+    Keeps track of the probe position in um, moves take distance/stage_speed
+    seconds plus the configured latency.
+
+    Settings (the sim_settings of the autolab config):
+        latency: seconds every call takes
+        stage_speed: travel speed of the stage in um/s, 0 for instant moves
+        wash_position: [x, y] of the wash position in um"""
+
+    def __init__(self, settings: dict = None) -> None:
+        settings = settings if settings is not None else {}
+        self.latency = settings.get("latency", 0.0)
+        self.stage_speed = settings.get("stage_speed", 0)
+        self.wash_position = tuple(settings.get("wash_position", (0, -10000)))
+        self.position = (0.0, 0.0)
+        self.travelled_distance = 0.0
+
+    def new_substrate(self) -> None:
+        self.move_to((0.0, 0.0))
+
+    def prepare_next_experiment(self, distance: float) -> None:
+        self.move_to((self.position[0] + distance, self.position[1]))
+
+    def move_to_wash(self) -> None:
+        self.move_to(self.wash_position)
+
+    def move_to(self, position: tuple) -> None:
+        distance = ((position[0] - self.position[0])**2 + (position[1] - self.position[1])**2)**0.5
+        delay = self.latency + (distance/self.stage_speed if self.stage_speed > 0 else 0)
+        if delay > 0:
+            time.sleep(delay)
+        self.position = (float(position[0]), float(position[1]))
+        self.travelled_distance += distance
@@ -0,0 +1,272 @@
+import os
+import json
+import numpy as np
+
+FREE = "free"
+USED = "used"
+FAILED = "failed"
+
+class SpotMap:
+
+    """ Persistent map of the experiment spots on a substrate.
+
+    The spots lie on a grid of columns x rows with the given pitch (um) starting at
+    origin, spot i is in row i // columns and column i % columns. Every spot is free,
+    used or failed, the states and the last probe position are kept in a JSON file
+    at map_path, so a substrate can be resumed and packed without gaps.
+    If map_path exists the map is loaded from it and the other arguments are ignored.
+
+    The free spots are visited in the order returned by plan: a nearest neighbour
+    tour from the probe position improved with 2-opt, which keeps the stage travel
+    short also on partially used substrates. With wash_every set the probe is washed
+    at wash_position (um) after every wash_every measured spots. The tour is then
+    planned in blocks of wash_every spots, each starting at the wash position and
+    ending next to it, so the trips to the wash and back are part of the travel
+    that is kept short. The tour is planned once and followed until the probe
+    position is set from outside (set_position, move_to_wash).
+    move_to moves the SECM to a spot, washing first if a wash is due, with
+    move_to(position) of the SECM if it has one, otherwise with prepare_next_experiment
+    along x. Without move_to only the spots of a map with a single row are reachable,
+    the plan is then the order along the row, and the probe can not return from the
+    wash between spots (see check_secm)."""
+
+    def __init__(self,
+                 map_path: os.PathLike,
+                 columns: int = None,
+                 rows: int = None,
+                 pitch: float = 2500,
+                 origin: tuple = (0, 0),
+                 wash_position: tuple = None,
+                 wash_every: int = None) -> None:
+
+        self.map_path = map_path
+        if os.path.isfile(map_path):
+            with open(map_path) as map_file:
+                saved = json.load(map_file)
+            columns, rows, pitch, origin = saved["columns"], saved["rows"], saved["pitch"], saved["origin"]
+            self.states = saved["states"]
+            self.position = saved["position"]
+            wash_position, wash_every = saved.get("wash_position", wash_position), saved.get("wash_every", wash_every)
+            self.since_wash = saved.get("since_wash", 0)
+        elif columns is None or rows is None:
+            raise ValueError(f"No spot map at {map_path}, columns and rows are needed to create one")
+        else:
+            self.states = [FREE] * (columns * rows)
+            self.position = list(origin)
+            self.since_wash = 0 # Spots measured since the last wash
+        if wash_every is not None and wash_position is None:
+            raise ValueError("A wash position is needed to wash every {} spots".format(wash_every))
+
+        self.columns = columns
+        self.rows = rows
+        self.pitch = pitch
+        self.origin = list(origin)
+        self.wash_position = list(wash_position) if wash_position is not None else None
+        self.wash_every = wash_every
+        self._plan = None # Remaining visiting order, planned on the first call of next_spot after loading or set_position
+        self.save()
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def coordinates(self, spot: int) -> list:
+
+        """ Coordinates of the spot in um, as stored in SECMDataFile.coordinates."""
+
+        row, column = divmod(spot, self.columns)
+        return [self.origin[0] + column * self.pitch, self.origin[1] + row * self.pitch]
+
+    def spots(self, state: str = FREE) -> list:
+
+        """ Indices of all spots in the given state."""
+
+        return [spot for spot, spot_state in enumerate(self.states) if spot_state == state]
+
+    def mark_used(self, spot: int) -> None:
+        self._mark(spot, USED)
+
+    def mark_failed(self, spot: int) -> None:
+        self._mark(spot, FAILED)
+
+    def set_position(self, position: list = None) -> None:
+
+        """ Sets the probe position after it was moved without the map, to the origin by default
+        (where SECM.new_substrate leaves the probe)."""
+
+        self.position = list(position) if position is not None else list(self.origin)
+        self._plan = None
+        self.save()
+
+    def next_spot(self) -> int:
+
+        """ Next free spot of the planned visiting order, None if the substrate is full."""
+
+        if self._plan is None:
+            self._plan = self.plan()
+        while self._plan and self.states[self._plan[0]] != FREE: # used or failed since it was planned
+            self._plan.pop(0)
+        return self._plan[0] if self._plan else None
+
+    def check_secm(self, secm) -> None:
+
+        """ Raises ValueError if the SECM can not reach every spot of the map:
+        without move_to(position) it only moves along x, so the map needs a single row
+        and the probe can not return from the wash between spots."""
+
+        if hasattr(secm, "move_to"):
+            return
+        if self.rows > 1:
+            raise ValueError(f"The SECM can only move along x, the spot map at {self.map_path} "
+                             f"needs a single row instead of {self.rows}")
+        if self.wash_every is not None:
+            raise ValueError(f"The SECM can only move along x and can not return from the wash, "
+                             f"the spot map at {self.map_path} can not wash every {self.wash_every} spots")
+
+    def move_to(self, secm, spot: int) -> None:
+
+        """ Moves the probe of the SECM from the last position to the spot,
+        washing it first if wash_every spots were measured since the last wash."""
+
+        if self.wash_every is not None and self.since_wash >= self.wash_every:
+            self._wash(secm) # part of the planned tour
+        target = self.coordinates(spot)
+        if self.position is not None and target == list(self.position): # e.g. the first spot right after new_substrate
+            return
+        if hasattr(secm, "move_to"):
+            secm.move_to(target)
+        else:
+            self.check_secm(secm)
+            if self.position is None or self.position[1] != target[1]:
+                raise ValueError("The probe is not on the row of the spots, "
+                                 "call set_position after SECM.new_substrate")
+            secm.prepare_next_experiment(target[0] - self.position[0])
+        self.position = target
+        self.save()
+
+    def move_to_wash(self, secm) -> None:
+
+        """ Moves the probe of the SECM to the wash, e.g. when closing,
+        the tour is planned again from there."""
+
+        self._wash(secm)
+        self._plan = None
+
+    def plan(self, start: list = None) -> list:
+
+        """ Visiting order of all free spots starting at start (the probe position by default)
+        that keeps the total stage travel, including the trips to the wash, short."""
+
+        free = self.spots(FREE)
+        position = start if start is not None else self.position if self.position is not None else self.origin
+        if self.wash_every is None:
+            return self._tour(free, position)
+
+        order = []
+        block_size = max(self.wash_every - self.since_wash, 0) # spots left until the next wash
+        while len(order) < len(free):
+            if block_size == 0:
+                position, block_size = self.wash_position, self.wash_every
+            remaining = [spot for spot in free if spot not in order]
+            # Every block but the last ends with the trip to the wash
+            end = self.wash_position if len(remaining) > block_size else None
+            order += self._tour(remaining, position, block_size, end)
+            block_size = 0
+        return order
+
+    def travel_distance(self, order: list, start: list = None) -> float:
+
+        """ Stage travel in um to visit the spots in order from start (the probe position by default),
+        including the trips to the wash with wash_every set."""
+
+        points = [start if start is not None else self.position if self.position is not None else self.origin]
+        since_wash = self.since_wash
+        for spot in order:
+            if self.wash_every is not None and since_wash >= self.wash_every:
+                points.append(self.wash_position)
+                since_wash = 0
+            points.append(self.coordinates(spot))
+            since_wash += 1
+        points = np.array(points, dtype = float)
+        return float(np.sum(np.sqrt(np.sum(np.diff(points, axis = 0)**2, axis = 1))))
+
+    def save(self) -> None:
+        with open(self.map_path, "w") as map_file:
+            json.dump({"columns": self.columns,
+                       "rows": self.rows,
+                       "pitch": self.pitch,
+                       "origin": self.origin,
+                       "wash_position": self.wash_position,
+                       "wash_every": self.wash_every,
+                       "position": self.position,
+                       "since_wash": self.since_wash,
+                       "states": self.states}, map_file)
+
+    def _mark(self, spot: int, state: str) -> None:
+        self.states[spot] = state
+        self.since_wash += 1
+        self.save()
+
+    def _wash(self, secm) -> None:
+        secm.move_to_wash()
+        wash_position = self.wash_position if self.wash_position is not None else getattr(secm, "wash_position", None)
+        self.position = list(wash_position) if wash_position is not None else None # unknown until set_position
+        self.since_wash = 0
+        self.save()
+
+    def _tour(self, spots: list, start: list, length: int = None, end: list = None) -> list:
+
+        """ Short tour from start through length of the spots (all by default),
+        ending next to end if it is given."""
+
+        if not spots:
+            return []
+        length = len(spots) if length is None else min(length, len(spots))
+        nodes = [start] + [self.coordinates(spot) for spot in spots] + ([end] if end is not None else [])
+        nodes = np.array(nodes, dtype = float)
+        distance = np.sqrt(np.sum((nodes[:, None, :] - nodes[None, :, :])**2, axis = -1))
+        if end is None:
+            path = nearest_neighbour(distance, length)
+        else: # the end node is left out of the nearest neighbour tour and stays last in 2-opt
+            path = np.append(nearest_neighbour(distance[:-1, :-1], length), len(nodes) - 1)
+        path = two_opt(distance, path, fixed_end = end is not None)
+        return [spots[node - 1] for node in path[1:len(path) - (end is not None)]]
+
+def nearest_neighbour(distance: np.ndarray, length: int = None) -> np.ndarray:
+
+    """ Open tour through length nodes (all by default) of the distance matrix
+    starting at node 0, always going to the nearest node not visited yet."""
+
+    visited = np.zeros(len(distance), dtype = bool)
+    path = [0]
+    visited[0] = True
+    for _ in range(len(distance) - 1 if length is None else length):
+        remaining = np.where(visited, np.inf, distance[path[-1]])
+        path.append(int(np.argmin(remaining)))
+        visited[path[-1]] = True
+    return np.array(path)
+
+def two_opt(distance: np.ndarray, path: np.ndarray, max_passes: int = 20, fixed_end: bool = False) -> np.ndarray:
+
+    """ Shortens an open tour with fixed first node (and last node with fixed_end)
+    by reversing segments as long as that makes it shorter (at most max_passes passes over the tour)."""
+
+    path = path.copy()
+    n = len(path)
+    last = n - 1 if fixed_end else n # segments end before last
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, last - 1):
+            # Reversing path[i:j + 1] replaces the edges (i - 1, i) and (j, j + 1) with (i - 1, j) and (i, j + 1)
+            ends = np.arange(i + 1, last)
+            following = path[np.minimum(ends + 1, n - 1)]
+            change = distance[path[i - 1], path[ends]] - distance[path[i - 1], path[i]]
+            change += np.where(ends < n - 1,
+                               distance[path[i], following] - distance[path[ends], following],
+                               0)
+            best = int(np.argmin(change))
+            if change[best] < -1e-9:
+                path[i:ends[best] + 1] = path[i:ends[best] + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return path
@@ -0,0 +1,5 @@
+from .AbstractInstruments import *
+from .SimulatedPotentiostat import *
+from .SimulatedSecm import *
+from .SpotMap import *
+from .Backend import *
\ No newline at end of file
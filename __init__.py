@@ -1,4 +1,26 @@
-from .utils import *
-from .Ai import *
-from .Experiments import *
-from .FileManager import *
\ No newline at end of file
+import importlib
+
+# The subpackages are only imported when first used, so tools that only need
+# part of the package (e.g. parsing data files) do not load gymnasium or the instrument SDKs
+_SUBPACKAGES = ("utils", "Ai", "Experiments", "FileManager")
+
+def __getattr__(name: str):
+    if name in _SUBPACKAGES:
+        return importlib.import_module("." + name, __name__)
+    if name.startswith("__") and name.endswith("__"): # e.g. __wrapped__ looked up by introspection
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Names of the subpackages were available at the top level before. Look them up in the
+    # precedence of the former star imports (later ones won), Ai last as only it needs gymnasium
+    for subpackage in ("FileManager", "Experiments", "utils", "Ai"):
+        try:
+            module = importlib.import_module("." + subpackage, __name__)
+        except ImportError: # e.g. gymnasium is not installed, hasattr has to keep working
+            continue
+        if hasattr(module, name):
+            value = getattr(module, name)
+            globals()[name] = value
+            return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__() -> list:
+    return sorted(list(globals()) + list(_SUBPACKAGES))
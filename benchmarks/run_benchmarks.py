@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+ROOT_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_PATH)
+
+from Instruments import SimulatedPotentiostat
+from Experiments import LineSweep
+from FileManager.DataFile import SECMDataFile, FILE_FORMATS, parse_secm_datafile
+from Ai.OerEnvironment import OerEnvironmentSim, OerVectorEnvSim
+from utils.analysis import overpotential_from_procedure
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Metrics ending in one of these are better when higher, all others when lower
+HIGHER_IS_BETTER = ("per_second",)
+# Metrics with a baseline close to zero, a regression is an increase by more than these absolute values
+ABSOLUTE_TOLERANCES = {"mean_jitter_seconds": 0.001,
+                       "max_jitter_seconds": 0.005,
+                       "scan_rate_deviation": 0.02,
+                       "settle_time_seconds": 0.05}
+# Reported only, not compared against the baseline (achieved_scan_rate through scan_rate_deviation)
+NOT_COMPARED = ("overruns", "requested_steps_per_second", "achieved_scan_rate")
+# Seconds a fresh interpreter may take to import the modules used by analysis-only tools
+IMPORT_BUDGETS = {"utils.analysis": 0.3,
+                  "FileManager.DataFile": 1.0,
+                  "Experiments": 1.0}
+# Modules that must not be loaded by importing the modules in IMPORT_BUDGETS
+HEAVY_MODULES = ("gymnasium", "matplotlib", "autolab", "secm")
+IMPORT_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy_modules": [name for name in {heavy_modules} if name in sys.modules]}}))
+"""
+
+def benchmark_line_sweep(latency: float = 0.0005) -> dict:
+
+    """Achieved step rate and jitter of LineSweep.measure on the simulated potentiostat.
+    The step interval (10 ms) is well above the two instrument calls per step (2 * latency),
+    so jitter and overruns measure the pacing of the scheduler and not a growing backlog.
+    The equilibration after switching the cell on is reported separately as settle time."""
+
+    potentiostat = SimulatedPotentiostat({"latency": latency, "seed": 0})
+    sweep = LineSweep(potentiostat, {"start_potential": 0.2,
+                                     "end_potential": 0.3,
+                                     "scan_rate": 0.1,
+                                     "step_potential": 0.001})
+    sweep.measure()
+    statistics = sweep.sweep_statistics
+    return {"requested_steps_per_second": sweep.scan_rate/sweep.step_potential,
+            "steps_per_second": statistics["steps"]/statistics["elapsed_time"],
+            "achieved_scan_rate": statistics["achieved_scan_rate"],
+            # relative deviation from the requested scan rate, too slow and too fast are both wrong
+            "scan_rate_deviation": abs(statistics["achieved_scan_rate"] - sweep.scan_rate)/sweep.scan_rate,
+            "mean_jitter_seconds": statistics["mean_jitter"],
+            "max_jitter_seconds": statistics["max_jitter"],
+            "overruns": statistics["overruns"],
+            "settle_time_seconds": statistics["settle_time"]}
+
+def benchmark_datafile(rows: int, file_format: str, folder: str) -> dict:
+
+    """Write and parse throughput of SECMDataFile for one size and file format."""
+
+    data = pd.DataFrame(np.random.default_rng(0).random((rows, 4)),
+                        columns = ["time", "potential", "current", "potential_applied"])
+    file_path = os.path.join(folder, f"{rows}_{file_format}" + FILE_FORMATS[file_format])
+    datafile = SECMDataFile(file_path, data, "benchmark", "0", "none", 0, coordinates = [0, 0])
+
+    start = time.perf_counter()
+    datafile.write(file_format)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = parse_secm_datafile(file_path)
+    metadata_time = time.perf_counter() - start
+    len(parsed.data) # the data is only read on first access
+    parse_time = time.perf_counter() - start
+    os.remove(file_path)
+
+    return {"write_seconds": write_time,
+            "write_rows_per_second": rows/write_time,
+            "metadata_seconds": metadata_time,
+            "parse_seconds": parse_time,
+            "parse_rows_per_second": rows/parse_time}
+
+def benchmark_overpotential_fit(points: int = 500, repeats: int = 200) -> dict:
+
+    """Latency of extracting the overpotential from a finished procedure."""
+
+    potentiostat = SimulatedPotentiostat({"procedure_duration": 0, "procedure_points": points, "seed": 0})
+    procedure = potentiostat.instrument.LoadProcedure("Overpotential.nox")
+    procedure.Measure()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        overpotential_from_procedure(procedure, max_index = points//2)
+    return {"fit_seconds": (time.perf_counter() - start)/repeats}
+
+def benchmark_environment(steps: int = 20000, num_envs: int = 256) -> dict:
+
+    """Steps per second of the simulated environment and its batched version."""
+
+    environment = OerEnvironmentSim()
+    environment.reset(seed = 0)
+    start = time.perf_counter()
+    for step in range(steps):
+        _, _, terminated, _, _ = environment.step(step % 3)
+        if terminated:
+            environment.reset()
+    single_rate = steps/(time.perf_counter() - start)
+
+    vector_environment = OerVectorEnvSim(num_envs)
+    vector_environment.reset(seed = 0)
+    actions = np.random.default_rng(0).integers(0, 3, (steps//10, num_envs))
+    start = time.perf_counter()
+    for action in actions:
+        vector_environment.step(action)
+    vector_rate = actions.size/(time.perf_counter() - start)
+
+    return {"steps_per_second": single_rate,
+            "vector_steps_per_second": vector_rate}
+
+def benchmark_imports(repeats: int = 3) -> tuple:
+
+    """Import time of the modules in IMPORT_BUDGETS, each in a fresh interpreter (best of repeats).
+    Also returns the heavy modules every import loaded."""
+
+    results, heavy_modules = {}, {}
+    for module in IMPORT_BUDGETS:
+        script = IMPORT_SCRIPT.format(module = module, heavy_modules = HEAVY_MODULES)
+        runs = [json.loads(subprocess.run([sys.executable, "-c", script], cwd = ROOT_PATH, check = True,
+                                          capture_output = True, text = True).stdout)
+                for _ in range(repeats)]
+        results[f"{module}_seconds"] = min(run["seconds"] for run in runs)
+        heavy_modules[module] = runs[0]["heavy_modules"]
+    return results, heavy_modules
+
+def check_import_budgets(results: dict, heavy_modules: dict) -> list:
+
+    """Returns a description of every import over its budget or loading a heavy module."""
+
+    violations = []
+    for module, budget in IMPORT_BUDGETS.items():
+        seconds = results[f"{module}_seconds"]
+        if seconds > budget:
+            violations.append(f"import {module}: {seconds:.3f} s over the budget of {budget} s")
+        if heavy_modules[module]:
+            violations.append(f"import {module} loads {', '.join(heavy_modules[module])}")
+    return violations
+
+def run_benchmarks(sizes: list) -> dict:
+    results = {"line_sweep": benchmark_line_sweep(),
+               "overpotential_fit": benchmark_overpotential_fit(),
+               "environment": benchmark_environment()}
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in sizes:
+            for file_format in FILE_FORMATS:
+                results[f"datafile_{file_format}_{rows}"] = benchmark_datafile(rows, file_format, folder)
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+
+    """Returns a description of every metric that got worse than the baseline by more than
+    tolerance (relative), or by more than its entry in ABSOLUTE_TOLERANCES."""
+
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if reference is None or metric in NOT_COMPARED:
+                continue
+            if metric in ABSOLUTE_TOLERANCES:
+                regressed = value - reference > ABSOLUTE_TOLERANCES[metric]
+            elif reference == 0:
+                continue
+            else:
+                change = (value - reference)/abs(reference)
+                if metric.endswith(HIGHER_IS_BETTER):
+                    change = -change
+                regressed = change > tolerance
+            if regressed:
+                regressions.append(f"{name}.{metric}: {value:.4g} against baseline {reference:.4g}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmarks of the acquisition, storage and analysis hot paths")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [10_000, 100_000, 1_000_000],
+                        help = "numbers of rows of the data file benchmarks")
+    parser.add_argument("--report", default = "benchmark_report.json", help = "path of the JSON report")
+    parser.add_argument("--baseline", default = BASELINE_PATH, help = "baseline report to compare against")
+    parser.add_argument("--save-baseline", action = "store_true", help = "store the results as new baseline")
+    parser.add_argument("--tolerance", type = float, default = 0.2, help = "relative change counted as regression")
+    arguments = parser.parse_args()
+
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "results": run_benchmarks(arguments.sizes)}
+    report["results"]["imports"], heavy_modules = benchmark_imports()
+    with open(arguments.report, "w") as report_file:
+        json.dump(report, report_file, indent = 4)
+    print(json.dumps(report["results"], indent = 4))
+    violations = check_import_budgets(report["results"]["imports"], heavy_modules)
+    for violation in violations:
+        print("Import budget:", violation)
+
+    regressions = []
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent = 4)
+    elif os.path.isfile(arguments.baseline):
+        with open(arguments.baseline) as baseline_file:
+            regressions = compare(report["results"], json.load(baseline_file)["results"], arguments.tolerance)
+        for regression in regressions:
+            print("Regression:", regression)
+    if regressions or violations:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,22 @@
 import os
 import json
 
-from secm import SECM
 from Experiments import AbstractExperiment, LineSweep, NovaProcedure
-from autolab import Potentiostat
+from Experiments.Campaign import Campaign
+from FileManager import FileManager
+from utils.analysis import overpotential_from_datafile
+from Instruments import load_instruments, SpotMap
 from aec.config.definitions import ROOT_DIR
 
-"""TODO: Make Experiment loading more universal so that code doesn't need to be changed """
+# Experiment classes that can be named as experiment_class in an experiment json file
+EXPERIMENT_CLASSES = {experiment_class.__name__: experiment_class
+                      for experiment_class in (LineSweep, NovaProcedure)}
 
 def main():
-  secm = SECM()
-  with open(os.path.join(ROOT_DIR, "config\\autolab_config.json")) as config: # Access and load config file
+  with open(os.path.join(ROOT_DIR, "config", "autolab_config.json")) as config: # Access and load config file
     autolab_config  = json.load(config)
-  potentiostat = Potentiostat(config = autolab_config)
-    # TODO: Implement Experiment configs
+  # Simulated or real instruments depending on the sim flag of the config
+  potentiostat, secm = load_instruments(autolab_config)
 
   #Prompt user to insert experiment settings path
   experiment_path = input_experiment()
@@ -21,18 +24,33 @@ def main():
   with open(experiment_path) as config:
     experiment_config = json.load(config)
     experiment_class = experiment_config["experiment_class"]
-    experiment_metadata = experiment_config["experiments_metadata"]
+    experiment_metadata = experiment_config["experiment_metadata"]
     experiment_settings = experiment_config["experiment_settings"]
+    campaign_settings = experiment_config.get("campaign_settings", {})
+
+  experiment = EXPERIMENT_CLASSES[experiment_class].from_settings(potentiostat, experiment_settings)
+  save_path = campaign_settings.get("save_path") or input("Please input the root path to save the data to")
+  file_manager = FileManager(save_path)
+  spot_map = None
+  if campaign_settings.get("spot_map"): # One spot map per substrate (batch), kept in the save path
+    map_name = "spot_map_{:03d}.json".format(int(experiment_metadata["batch_id"]))
+    spot_map = SpotMap(os.path.join(save_path, map_name), **campaign_settings["spot_map"])
+  campaign = Campaign(experiment,
+                      secm,
+                      file_manager,
+                      experiment_metadata,
+                      spot_increment = campaign_settings.get("spot_increment", 2500),
+                      file_format = campaign_settings.get("file_format", "csv"),
+                      analyse = overpotential_from_datafile if experiment_class == "LineSweep" else None,
+                      spot_map = spot_map)
 
   number_of_experiments = int(input('Please input Number of Experiments to perform'))
-  
+  resume = os.path.isfile(campaign.progress_path) and input('Resume previous campaign? (y/n)').lower() == "y"
+
   secm.new_substrate()
-    
-  while True:
-    for experiment in range(number_of_experiments):
-      experiment.measure(experiment_config)
-      experiment.save_data(save_path)
-      secm.prepare_next_experiment(config["spot_increment"])
+  if spot_map is not None:
+    spot_map.set_position() # new_substrate leaves the probe at the origin
+  campaign.run(number_of_experiments, resume = resume)
 
 def input_experiment() -> os.PathLike:
 
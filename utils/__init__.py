@@ -1 +1,3 @@
-from .data_treatment import *
\ No newline at end of file
+from .data_treatment import *
+from .timing import *
+from .analysis import *
\ No newline at end of file
@@ -0,0 +1,143 @@
+import os
+import numpy as np
+from utils.data_treatment import current_density
+
+# Column names of the signals in the Overpotential.nox procedure
+NOVA_COLUMNS = {"potential": "Potential applied",
+                "current": "WE(1).Current",
+                "index": "Index",
+                "scan": "Scan"}
+# Column names of the data measured by the LineSweep experiment
+LINESWEEP_COLUMNS = {"potential": "potential_applied",
+                     "current": "current",
+                     "index": None,
+                     "scan": None}
+
+def signals_to_arrays(command, names: list = None) -> dict:
+
+    """Copies the signals of a Nova procedure command to NumPy arrays.
+    Each signal is read once and converted without an intermediate list.
+    Only the given signal names are copied, empty signals are left out."""
+
+    arrays = {}
+    for name in (names if names is not None else command.Signals.Names):
+        values = np.fromiter(command.Signals.get_Item(name).Value, dtype = float)
+        if values.size != 0:
+            arrays[name] = values
+    return arrays
+
+def overpotential_at_current_density(potential: np.ndarray,
+                                     current_density: np.ndarray,
+                                     target_current_density: float = 0.01,
+                                     window: tuple = (0.008, 0.015),
+                                     mask: np.ndarray = None) -> float:
+
+    """Interpolates the potential at the target current density (A/cm^2) with a linear fit
+    of the points whose current density lies inside the window.
+    Returns NaN if less than two points are in the window."""
+
+    selection = (current_density > window[0]) & (current_density < window[1])
+    if mask is not None:
+        selection &= mask
+    if np.count_nonzero(selection) < 2:
+        return float("nan")
+    slope, intercept = np.polyfit(potential[selection], current_density[selection], 1)
+    return float((target_current_density - intercept)/slope)
+
+def extract_overpotential(data,
+                          columns: dict = NOVA_COLUMNS,
+                          electrode_diameter: float = 0.05,
+                          target_current_density: float = 0.01,
+                          window: tuple = (0.008, 0.015),
+                          max_index: int = None,
+                          scan: int = None) -> float:
+
+    """Extracts the overpotential at the target current density from measured data.
+
+    data maps column names to arrays (a dict of signals or a data frame).
+    columns gives the names of the potential, current, index and scan columns.
+    max_index limits the fit to points with a lower index (e.g. the forward sweep),
+    scan to the points of one scan of a cyclic voltammogram."""
+
+    potential = np.asarray(data[columns["potential"]], dtype = float)
+    density = current_density(np.asarray(data[columns["current"]], dtype = float), electrode_diameter)
+
+    mask = np.ones(potential.size, dtype = bool)
+    if max_index is not None:
+        index = (np.asarray(data[columns["index"]]) if columns["index"] is not None
+                 else np.arange(potential.size))
+        mask &= index < max_index
+    if scan is not None:
+        mask &= np.asarray(data[columns["scan"]]) == scan
+
+    return overpotential_at_current_density(potential, density, target_current_density, window, mask)
+
+def overpotential_from_procedure(procedure,
+                                 command_name: str = "Overpotential CV",
+                                 columns: dict = NOVA_COLUMNS,
+                                 max_index: int = 250,
+                                 scan: int = None,
+                                 **kwargs) -> float:
+
+    """Extracts the overpotential from a measured Nova procedure.
+    Only the signals needed for the fit are copied from the instrument."""
+
+    names = [columns["potential"], columns["current"]]
+    if max_index is not None and columns["index"] is not None:
+        names.append(columns["index"])
+    if scan is not None:
+        names.append(columns["scan"])
+    arrays = signals_to_arrays(procedure.Commands[command_name], names)
+    return extract_overpotential(arrays, columns, max_index = max_index, scan = scan, **kwargs)
+
+def overpotential_from_datafile(datafile,
+                                columns: dict = LINESWEEP_COLUMNS,
+                                **kwargs) -> float:
+
+    """Extracts the overpotential from a saved SECMDataFile or the path to one.
+    When a path is given only the columns needed for the fit are read."""
+
+    if isinstance(datafile, (str, os.PathLike)):
+        from FileManager.DataFile import parse_secm_datafile
+
+        names = [name for name in columns.values() if name is not None]
+        datafile = parse_secm_datafile(datafile, columns = names)
+    return extract_overpotential(datafile.data, columns, **kwargs)
+
+def tafel_slope(potential: np.ndarray,
+                current_density: np.ndarray,
+                window: tuple = (1e-4, 1e-3),
+                mask: np.ndarray = None) -> float:
+
+    """Tafel slope in mV/dec from a linear fit of the potential against log10 of the
+    current density for the points whose current density (A/cm^2) lies inside the window.
+    Returns NaN if less than two points are in the window."""
+
+    selection = (current_density > window[0]) & (current_density < window[1])
+    if mask is not None:
+        selection &= mask
+    if np.count_nonzero(selection) < 2:
+        return float("nan")
+    slope, _ = np.polyfit(np.log10(current_density[selection]), potential[selection], 1)
+    return float(1000 * slope)
+
+def onset_potential(potential: np.ndarray,
+                    current_density: np.ndarray,
+                    threshold: float = 1e-3,
+                    mask: np.ndarray = None) -> float:
+
+    """Potential at which the current density first exceeds the threshold (A/cm^2),
+    linearly interpolated between the two neighbouring points.
+    Returns NaN if the threshold is never reached."""
+
+    if mask is not None:
+        potential, current_density = potential[mask], current_density[mask]
+    above = np.flatnonzero(current_density > threshold)
+    if above.size == 0:
+        return float("nan")
+    first = above[0]
+    if first == 0:
+        return float(potential[0])
+    return float(np.interp(threshold,
+                           current_density[first - 1:first + 1],
+                           potential[first - 1:first + 1]))
@@ -0,0 +1,180 @@
+import os
+import json
+import argparse
+import hashlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from utils.data_treatment import current_density
+from utils.analysis import (NOVA_COLUMNS, LINESWEEP_COLUMNS, overpotential_at_current_density,
+                            tafel_slope, onset_potential)
+
+SUMMARY_FILE_NAME = "analysis_summary.csv"
+# Data file extensions, converted files are preferred as they are read faster
+DATA_FILE_EXTENSIONS = (".feather", ".npz", ".csv")
+# Parameters of the analysis, stored with every row of the summary
+DEFAULT_PARAMETERS = {"electrode_diameter": 0.05, #cm
+                      "target_current_density": 0.01, #A/cm^2
+                      "overpotential_window": [0.008, 0.015], #A/cm^2
+                      "tafel_window": [1e-4, 1e-3], #A/cm^2
+                      "onset_threshold": 1e-3} #A/cm^2
+
+def file_hash(file_path: os.PathLike) -> str:
+
+    """SHA-1 hash of the file content."""
+
+    sha1 = hashlib.sha1()
+    with open(file_path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def analyse_file(file_path: os.PathLike, parameters: dict = None) -> dict:
+
+    """Computes the metrics of one SECM data file: the overpotential at the target
+    current density, the Tafel slope and the onset potential, with the parameters
+    (see DEFAULT_PARAMETERS). Runs in the worker processes, errors are reported
+    in the error column."""
+
+    from FileManager.DataFile import parse_secm_datafile
+
+    parameters = {**DEFAULT_PARAMETERS, **(parameters or {})}
+    result = {"file_path": file_path,
+              "mtime": os.path.getmtime(file_path),
+              "sha1": file_hash(file_path),
+              "analysis_parameters": parameters_key(parameters)}
+    try:
+        datafile = parse_secm_datafile(file_path)
+        result.update(datafile.metadata())
+        data = datafile.data
+        columns = LINESWEEP_COLUMNS if LINESWEEP_COLUMNS["potential"] in data.columns else NOVA_COLUMNS
+        potential = data[columns["potential"]].to_numpy(dtype = float)
+        density = current_density(data[columns["current"]].to_numpy(dtype = float), parameters["electrode_diameter"])
+        mask = None
+        if columns["scan"] is not None and columns["scan"] in data.columns: # only use the first scan of a CV
+            mask = data[columns["scan"]].to_numpy() == data[columns["scan"]].iloc[0]
+
+        result["overpotential"] = overpotential_at_current_density(potential,
+                                                                   density,
+                                                                   parameters["target_current_density"],
+                                                                   window = tuple(parameters["overpotential_window"]),
+                                                                   mask = mask)
+        result["tafel_slope"] = tafel_slope(potential, density, window = tuple(parameters["tafel_window"]), mask = mask)
+        result["onset_potential"] = onset_potential(potential, density, parameters["onset_threshold"], mask = mask)
+        result["error"] = None
+    except Exception as error: # one broken file must not stop the batch
+        result["error"] = f"{error.__class__.__name__}: {error}"
+    return result
+
+def parameters_key(parameters: dict) -> str:
+
+    """The analysis parameters as JSON string, as stored in the summary."""
+
+    return json.dumps(parameters, sort_keys = True)
+
+def find_data_files(root_path: os.PathLike) -> list:
+
+    """Lists the SECM data files below root_path, i.e. the files named by the
+    FileManager naming scheme (see ExperimentIndex.FILE_NAME_PATTERN), so campaign
+    timing tables, spool files and summaries are left out. If an experiment was
+    converted (FileManager.DataFile.convert_archive) only one of its files is listed,
+    the first in the order of DATA_FILE_EXTENSIONS."""
+
+    from FileManager.ExperimentIndex import FILE_NAME_PATTERN
+
+    experiments = {} # file path without extension: extensions found
+    for folder_path, _, file_names in os.walk(root_path):
+        for file_name in file_names:
+            stem, extension = os.path.splitext(file_name)
+            if extension in DATA_FILE_EXTENSIONS and FILE_NAME_PATTERN.match(file_name):
+                experiments.setdefault(os.path.abspath(os.path.join(folder_path, stem)), set()).add(extension)
+    return sorted(stem + min(extensions, key = DATA_FILE_EXTENSIONS.index)
+                  for stem, extensions in experiments.items())
+
+def reanalyse(root_path: os.PathLike,
+              summary_path: os.PathLike = None,
+              workers: int = None,
+              electrode_diameter: float = 0.05,
+              **parameters) -> pd.DataFrame:
+
+    """Analyses all data files below root_path in a process pool and writes the
+    results to a single summary table. The summary doubles as cache: a file is only
+    analysed again if its modification time and its content hash changed, or if
+    it was analysed with other parameters. parameters overrides the other entries
+    of DEFAULT_PARAMETERS."""
+
+    parameters = {**DEFAULT_PARAMETERS, **parameters, "electrode_diameter": electrode_diameter}
+    unknown = set(parameters) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise TypeError(f"Unknown analysis parameters {', '.join(sorted(unknown))}")
+    key = parameters_key(parameters)
+
+    if summary_path is None:
+        summary_path = os.path.join(root_path, SUMMARY_FILE_NAME)
+
+    cached = {}
+    if os.path.isfile(summary_path):
+        cached = {row["file_path"]: row for row in pd.read_csv(summary_path).to_dict("records")}
+
+    rows, to_analyse = [], []
+    for file_path in find_data_files(root_path):
+        if file_path == os.path.abspath(summary_path):
+            continue
+        row = cached.get(file_path)
+        if row is not None and row.get("analysis_parameters") == key:
+            mtime = os.path.getmtime(file_path)
+            if row["mtime"] == mtime:
+                rows.append(row)
+                continue
+            if row["sha1"] == file_hash(file_path): # touched but not changed
+                row["mtime"] = mtime
+                rows.append(row)
+                continue
+        to_analyse.append(file_path)
+
+    if to_analyse:
+        workers = workers or os.cpu_count()
+        chunksize = max(1, len(to_analyse)//(4 * workers))
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            rows.extend(executor.map(analyse_file,
+                                     to_analyse,
+                                     [parameters] * len(to_analyse),
+                                     chunksize = chunksize))
+
+    summary = pd.DataFrame(rows)
+    if not summary.empty:
+        summary = summary.sort_values("file_path")
+    summary.to_csv(summary_path, index = False)
+    return summary
+
+def main() -> None:
+
+    """Command line interface of the batch reanalysis."""
+
+    parser = argparse.ArgumentParser(description = "Reanalyses all SECM data files below a FileManager root path")
+    parser.add_argument("root_path")
+    parser.add_argument("--summary", help = f"path of the summary table, default root_path/{SUMMARY_FILE_NAME}")
+    parser.add_argument("--workers", type = int, help = "number of worker processes, default number of CPUs")
+    parser.add_argument("--electrode-diameter", type = float, default = DEFAULT_PARAMETERS["electrode_diameter"],
+                        help = "in cm")
+    parser.add_argument("--target-current-density", type = float,
+                        default = DEFAULT_PARAMETERS["target_current_density"], help = "in A/cm^2")
+    parser.add_argument("--overpotential-window", type = float, nargs = 2,
+                        default = DEFAULT_PARAMETERS["overpotential_window"], help = "in A/cm^2")
+    parser.add_argument("--tafel-window", type = float, nargs = 2,
+                        default = DEFAULT_PARAMETERS["tafel_window"], help = "in A/cm^2")
+    parser.add_argument("--onset-threshold", type = float,
+                        default = DEFAULT_PARAMETERS["onset_threshold"], help = "in A/cm^2")
+    arguments = parser.parse_args()
+
+    summary = reanalyse(arguments.root_path,
+                        arguments.summary,
+                        arguments.workers,
+                        arguments.electrode_diameter,
+                        target_current_density = arguments.target_current_density,
+                        overpotential_window = arguments.overpotential_window,
+                        tafel_window = arguments.tafel_window,
+                        onset_threshold = arguments.onset_threshold)
+    print(f"{len(summary)} files in summary")
+
+if __name__ == "__main__":
+    main()
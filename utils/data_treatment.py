@@ -1,6 +1,3 @@
-import pandas as pd
-import os
-import matplotlib.pyplot as plt
 from math import pi
 
 gdrive_path = "G:\\Andere Computer\\My Computer\\HPS Data"
@@ -11,6 +8,7 @@ def filename (number: str) -> str:
 def area_circle(diameter: float) -> float:
     return pi * (0.5 * diameter)**2
 
-def current_density(current):
-    area = area_circle(0.05)
+def current_density(current, electrode_diameter: float = 0.05):
+    """Current density in A/cm^2, works element-wise on arrays and series."""
+    area = area_circle(electrode_diameter)
     return current/area
\ No newline at end of file
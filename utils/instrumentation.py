@@ -0,0 +1,115 @@
+import os
+import csv
+import time
+import threading
+import functools
+from contextlib import nullcontext
+
+# Returned by span while tracing is disabled, entering and leaving it does nothing
+_NULL_SPAN = nullcontext()
+
+class Tracer:
+
+    """ Collects how much time is spent in named stages, grouped per spot.
+
+    Stages are timed with the span context manager or the timed decorator.
+    While the tracer is disabled span returns a shared no-op context, so the
+    instrumentation can stay in the hot paths. Per spot and stage the number of
+    calls, the total and the maximum duration are kept, not every single call.
+    The spot is set per thread with begin_spot, so work done on a worker thread
+    is attributed to the spot it belongs to.
+    Setting the environment variable AEC_TRACE=1 enables the module tracer."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.totals = {} # (spot, stage) -> [count, total seconds, max seconds]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.totals = {}
+
+    def begin_spot(self, spot) -> None:
+
+        """ Attributes the following spans of the calling thread to the spot."""
+
+        self._local.spot = spot
+
+    def span(self, stage: str):
+
+        """ Context manager timing the enclosed block as the stage."""
+
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage: str, duration: float) -> None:
+        key = (getattr(self._local, "spot", None), stage)
+        with self._lock:
+            entry = self.totals.get(key)
+            if entry is None:
+                self.totals[key] = [1, duration, duration]
+            else:
+                entry[0] += 1
+                entry[1] += duration
+                entry[2] = max(entry[2], duration)
+
+    def timed(self, stage: str):
+
+        """ Decorator timing every call of the function as the stage."""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Span(self, stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def export(self, file_path: os.PathLike) -> None:
+
+        """ Writes the per spot timing breakdown to a CSV file."""
+
+        with self._lock:
+            rows = [(spot, stage, count, total, maximum)
+                    for (spot, stage), (count, total, maximum) in self.totals.items()]
+        with open(file_path, "w", newline = "") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(("spot", "stage", "count", "total_seconds", "max_seconds"))
+            writer.writerows(rows)
+
+class _Span:
+
+    def __init__(self, tracer: Tracer, stage: str) -> None:
+        self.tracer = tracer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.tracer.record(self.stage, time.perf_counter() - self.start)
+
+tracer = Tracer(enabled = os.environ.get("AEC_TRACE", "") == "1")
+
+def span(stage: str):
+
+    """ Times the enclosed block as the stage with the module tracer."""
+
+    return tracer.span(stage)
+
+def timed(stage: str):
+
+    """ Times every call of the decorated function as the stage with the module tracer."""
+
+    return tracer.timed(stage)
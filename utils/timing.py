@@ -0,0 +1,111 @@
+import time
+from concurrent.futures import CancelledError
+
+class DeadlineScheduler:
+
+    """Paces periodic steps against absolute deadlines on a monotonic clock.
+
+    The deadline of step k lies at start + k * interval. Time spent between two
+    waits (instrument I/O, agent inference) is taken out of the wait instead of
+    being added to it, so the step rate does not drift.
+    The jitter (time past the deadline when the wait returns) of every step is
+    recorded, steps that only started waiting after their deadline count as overruns."""
+
+    def __init__(self, interval: float, clock = time.perf_counter, sleep = time.sleep) -> None:
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.start_time = None
+        self.step = 0
+        self.jitter = []
+        self.overruns = 0
+
+    def start(self) -> float:
+
+        """Starts the schedule at the current time and clears the statistics."""
+
+        self.start_time = self.clock()
+        self.step = 0
+        self.jitter = []
+        self.overruns = 0
+        return self.start_time
+
+    def elapsed(self) -> float:
+
+        """Seconds since the schedule was started."""
+
+        return self.clock() - self.start_time
+
+    def wait_next(self) -> float:
+
+        """Waits for the deadline of the next step and returns its jitter."""
+
+        self.step += 1
+        return self.wait_until(self.step * self.interval)
+
+    def wait_until(self, offset: float) -> float:
+
+        """Waits until offset seconds after the start of the schedule
+        and returns the jitter against that deadline."""
+
+        if self.start_time is None:
+            self.start()
+        deadline = self.start_time + offset
+        remaining = deadline - self.clock()
+        if remaining > 0:
+            self.sleep(remaining)
+        else:
+            self.overruns += 1
+        jitter = self.clock() - deadline
+        self.jitter.append(jitter)
+        return jitter
+
+    def statistics(self) -> dict:
+
+        """Summary of the jitter of all steps since the schedule was started."""
+
+        steps = len(self.jitter)
+        return {"steps": steps,
+                "elapsed_time": self.elapsed() if self.start_time is not None else 0.0,
+                "mean_jitter": sum(self.jitter)/steps if steps else 0.0,
+                "max_jitter": max(self.jitter) if steps else 0.0,
+                "overruns": self.overruns}
+
+def wait_until(condition,
+               timeout: float = None,
+               expected_duration: float = None,
+               min_interval: float = 0.001,
+               max_interval: float = 0.1,
+               cancel_event = None,
+               clock = time.perf_counter,
+               sleep = time.sleep) -> float:
+
+    """Polls condition until it returns True and returns the time waited.
+
+    Before the expected duration has passed the poll interval is half the
+    remaining expected time (at most max_interval), afterwards polling starts at
+    min_interval and backs off by 1.5x per poll up to max_interval. This keeps
+    the dead time after completion short without spinning on long waits.
+    Raises TimeoutError after timeout seconds and CancelledError if the
+    cancel_event (a threading.Event) is set."""
+
+    start = clock()
+    interval = min_interval
+    while not condition():
+        if cancel_event is not None and cancel_event.is_set():
+            raise CancelledError("Waiting was cancelled")
+        elapsed = clock() - start
+        if timeout is not None and elapsed > timeout:
+            raise TimeoutError(f"Condition not met within {timeout} s")
+        if expected_duration is not None and elapsed < expected_duration:
+            delay = min(max((expected_duration - elapsed)/2, min_interval), max_interval)
+        else:
+            delay = interval
+            interval = min(interval * 1.5, max_interval)
+        if timeout is not None:
+            delay = min(delay, max(timeout - elapsed, 0))
+        if cancel_event is not None:
+            cancel_event.wait(delay) # returns early when cancelled
+        else:
+            sleep(delay)
+    return clock() - start